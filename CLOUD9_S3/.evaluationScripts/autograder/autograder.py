@@ -1,11 +1,15 @@
-import requests
-from bs4 import BeautifulSoup
 import json
-import boto3
-import cv2
-from botocore.exceptions import NoCredentialsError, ClientError
-import time
-def upload_image_and_get_id(data):
+import os
+import aws_clients
+import flash_messages
+import http_probe
+import image_compare
+import lazy_imports
+import multipart
+
+botocore_exceptions = lazy_imports.lazy('botocore.exceptions')
+
+def upload_image_and_get_id(data, config_data):
     result = {
         "testid": "Photo Upload Check",
         "status": "failure",
@@ -15,45 +19,47 @@ def upload_image_and_get_id(data):
     }
     try:
         # Read the application configuration
-        with open('data.json', 'r') as file:
-            config_data = json.load(file)
-            url = f"http://{config_data['public_ip']}:{config_data['port']}/"
-        # Check if the URL is accessible
-        start_time = time.time()
-        while time.time() - start_time < 5:
-            try: 
-                response = requests.get(url)
-                if response.status_code == 200: 
-                    break 
-            except requests.exceptions.RequestException: 
-                time.sleep(1) 
-        else: 
-            result['message'] = f"Error: Failed to connect to the application at {url} within 5 seconds." 
-            data.append(result) 
-            return None
-
-        # Upload the image
-        files = {'file': ('valid_image.jpg', open('valid_image.jpg', 'rb'), 'image/jpeg')}
-        response = requests.post(url, files=files)
-        html_content = response.content
-
-        # Parse the flash messages to get the image_id
-        soup = BeautifulSoup(html_content, 'html.parser')
-        for div in soup.find_all('div', class_='alert'):
-            message = div.text.strip()
-            if "File uploaded successfully." in message:
-                id_start = message.find("Image ID: ") + len("Image ID: ")
-                image_id = message[id_start:].strip()
-                if not image_id:
-                    result['message'] = "Image ID not found"
-                    data.append(result)
-                    return None
-                result['status'] = "success"
-                result['score'] = 1
-                result['message'] = "Image uploaded successfully"
+        if config_data is None:
+            raise FileNotFoundError('data.json')
+        if isinstance(config_data, Exception):
+            # data.json could not be parsed; report why
+            raise config_data
+        url = f"http://{config_data['public_ip']}:{config_data['port']}/"
+        with http_probe.new_session() as session:
+            # Wait for the application to answer, with bounded attempts
+            probe = http_probe.wait_until_ready(session, url)
+            result['probe latency'] = round(probe.latency, 3)
+            if not probe.ready:
+                result['message'] = (f"Error: Failed to connect to the application at {url} within "
+                                     f"{http_probe.READY_TIMEOUT:g} seconds ({probe.error}).")
+                data.append(result)
+                return None
+
+            # Upload the image over the connection the probe opened, streamed
+            # from the shared mapping of the reference image
+            body = multipart.MultipartBody('file', 'valid_image.jpg', multipart.mapped_file('valid_image.jpg'), 'image/jpeg')
+            response = session.post(
+                url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=(http_probe.CONNECT_TIMEOUT, http_probe.UPLOAD_TIMEOUT),
+                stream=True
+            )
+            # Scan the flash messages for the image_id as the page arrives
+            with response:
+                image_id = flash_messages.find_image_id(response)
+
+        if image_id is not None:
+            if not image_id:
+                result['message'] = "Image ID not found"
                 data.append(result)
-                return image_id
-        
+                return None
+            result['status'] = "success"
+            result['score'] = 1
+            result['message'] = "Image uploaded successfully"
+            data.append(result)
+            return image_id
+
         # If no image_id found
         result['message'] = "Error: Image ID not found in the response."
         data.append(result)
@@ -68,7 +74,7 @@ def upload_image_and_get_id(data):
         data.append(result)
         return None
 
-def check_bucket(data, uploaded_image_name):
+def check_bucket(data, config_data, uploaded_image_name):
     result = {
         "testid": "S3 Bucket Check",
         "status": "failure",
@@ -77,64 +83,36 @@ def check_bucket(data, uploaded_image_name):
         "message": ""
     }
     try:
-        # Load the data.json file
-        with open('data.json') as f:
-            config_data = json.load(f)
-
         # Extract the necessary information
         access_key = config_data['INSTRUCTOR Access key ID']
         secret_key = config_data['INSTRUCTOR Secret Access Key']
         bucket_name = config_data['s3 bucket name']
         region = config_data['Region']
 
-        # Create a session using the provided IAM user credentials
-        session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        # Create an S3 resource object using the above session
-        s3 = session.resource('s3')
+        # Reuse the shared S3 client for these credentials
+        s3 = aws_clients.get_client('s3', access_key, secret_key, region)
 
         # Check if the bucket exists
         try:
-            s3.meta.client.head_bucket(Bucket=bucket_name)
-        except ClientError:
+            s3.head_bucket(Bucket=bucket_name)
+        except botocore_exceptions.ClientError:
             result["message"]= f'Bucket {bucket_name} does not exist.'
             data.append(result)
             return
-        # Download the uploaded image
+        # Stream the uploaded image into memory; nothing touches the disk
         try:
-            s3.Bucket(bucket_name).download_file(uploaded_image_name, 'uploaded_image.jpg')
-        except NoCredentialsError:
+            uploaded_image = image_compare.read_object(s3, bucket_name, uploaded_image_name)
+        except botocore_exceptions.NoCredentialsError:
             result["message"]= "Credentials not available"
             data.append(result)
             return
-        except ClientError:
+        except botocore_exceptions.ClientError:
             result["message"]= f"Object {uploaded_image_name} does not exist in the bucket."
             data.append(result)
             return
 
-        # Load the input image and the downloaded image
-        input_image = cv2.imread('valid_image.jpg')
-        uploaded_image = cv2.imread('uploaded_image.jpg')
-
-        # Resize the input image to match the size of the uploaded image
-        resized_input_image = cv2.resize(input_image, (uploaded_image.shape[1], uploaded_image.shape[0]))
-
-        # Calculate the histograms of the images
-        hist_input_image = cv2.calcHist([resized_input_image], [0], None, [256], [0, 256])
-        hist_uploaded_image = cv2.calcHist([uploaded_image], [0], None, [256], [0, 256])
-
-        # Normalize the histograms
-        hist_input_image = cv2.normalize(hist_input_image, hist_input_image)
-        hist_uploaded_image = cv2.normalize(hist_uploaded_image, hist_uploaded_image)
-
-        # Compare the histograms
-        comparison = cv2.compareHist(hist_input_image, hist_uploaded_image, cv2.HISTCMP_CORREL)
-        
-        if comparison >= 0.9:
+        # Compare the uploaded image with the stored reference fingerprint
+        if image_compare.matches_reference(uploaded_image):
             result['status'] = "success"
             result['score'] = 1
             result["message"]= "Bucket Checked Successfully"
@@ -154,14 +132,13 @@ def check_bucket(data, uploaded_image_name):
 
     data.append(result)
 
-def main():
-    overall = {"data": []}
+def grade(config_data):
     data = []
 
     # Example usage
-    image_id = upload_image_and_get_id(data)
+    image_id = upload_image_and_get_id(data, config_data)
     if image_id:
-        check_bucket(data, image_id)
+        check_bucket(data, config_data, image_id)
     else:
         result = {
             "testid": "S3 Bucket Check",
@@ -171,8 +148,27 @@ def main():
             "message": "First Upload the Image Properly"
         }
         data.append(result)
+    return data
+
+def evaluate(lab_directory='.'):
+    """
+    Grade the submission in lab_directory and return the evaluate.json payload.
+    """
+    overall = {"data": []}
+    try:
+        with open(os.path.join(lab_directory, 'data.json')) as f:
+            config_data = json.load(f)
+    except FileNotFoundError:
+        config_data = None
+    except Exception as e:
+        # Malformed data.json: the upload check fails with this error
+        config_data = e
+
+    overall['data'] = grade(config_data)
+    return overall
 
-    overall['data'] = data
+def main():
+    overall = evaluate()
     # Save the result to evaluate.json
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
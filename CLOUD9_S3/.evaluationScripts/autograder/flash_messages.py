@@ -0,0 +1,86 @@
+"""
+Find the Image ID in the flash messages of the upload page.
+
+The page is scanned as it streams in: every alert div is matched with one
+bounded regular expression over the bytes received so far, and reading stops
+at the first alert that reports a successful upload, usually before the end
+of the page. Only when the scan finds no such alert is the whole page parsed
+with BeautifulSoup, which is only imported then, so the common path neither
+loads bs4 nor builds a DOM.
+"""
+import html
+import re
+
+import lazy_imports
+
+bs4 = lazy_imports.lazy('bs4')
+
+SUCCESS_MESSAGE = "File uploaded successfully."
+ID_PREFIX = "Image ID: "
+# Longest alert markup the scan looks for; an alert is a short sentence
+MAX_ALERT_BYTES = 4096
+CHUNK_SIZE = 8192
+
+# A div whose class attribute has "alert" as one of its whitespace-separated
+# tokens, the same test as BeautifulSoup's class_='alert' (case-sensitive;
+# "alert-success" alone does not count)
+ALERT_PATTERN = re.compile(
+    rb'<div\b[^>]{0,256}?\sclass\s*=\s*["\'](?:[^"\']{0,128}?\s)?(?-i:alert)(?=[\s"\'])[^>]{0,256}>(.{0,%d}?)</div\s*>'
+    % MAX_ALERT_BYTES,
+    re.IGNORECASE | re.DOTALL
+)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+
+
+def image_id_in(message):
+    """
+    The Image ID in a success message (empty if it names none), or None if
+    message does not report a successful upload.
+    """
+    if SUCCESS_MESSAGE not in message:
+        return None
+    id_start = message.find(ID_PREFIX) + len(ID_PREFIX)
+    return message[id_start:].strip()
+
+
+def scan_alerts(buffer, start=0):
+    """
+    Yield the text of every complete alert div in buffer from start on,
+    with the offset just past it.
+    """
+    for match in ALERT_PATTERN.finditer(buffer, start):
+        text = TAG_PATTERN.sub('', match.group(1).decode('utf-8', 'replace'))
+        yield html.unescape(text).strip(), match.end()
+
+
+def parse_image_id(content):
+    """
+    Full parse of the page; the fallback for markup the scan cannot read.
+    """
+    soup = bs4.BeautifulSoup(content, 'html.parser')
+    for div in soup.find_all('div', class_='alert'):
+        image_id = image_id_in(div.text.strip())
+        if image_id is not None:
+            return image_id
+    return None
+
+
+def find_image_id(response):
+    """
+    Read a streamed requests response until its Image ID is found. Returns
+    the ID (empty if the success message names none), or None if no alert
+    reports a successful upload.
+    """
+    buffer = bytearray()
+    # Everything before this offset has been scanned and holds no open alert
+    scanned = 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        buffer += chunk
+        for message, end in scan_alerts(buffer, scanned):
+            image_id = image_id_in(message)
+            if image_id is not None:
+                return image_id
+            scanned = end
+        # An alert may have started in the part without a complete match
+        scanned = max(scanned, len(buffer) - MAX_ALERT_BYTES - 1024)
+    return parse_image_id(bytes(buffer))
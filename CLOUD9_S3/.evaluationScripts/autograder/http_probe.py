@@ -0,0 +1,91 @@
+"""
+Readiness probing of the student's web application.
+
+The grader waits for the application to answer GET / with 200 before
+uploading to it. Every attempt is bounded by CONNECT_TIMEOUT and READ_TIMEOUT,
+so a host that drops packets costs one connect timeout rather than hanging
+the grader, and attempts are spaced by exponential backoff with full jitter
+until READY_TIMEOUT has passed. The probe runs on a requests.Session whose
+kept-alive connection is then reused by the upload.
+
+    GRADER_HTTP_READY_TIMEOUT    seconds the application has to come up (5)
+    GRADER_HTTP_CONNECT_TIMEOUT  seconds allowed for one TCP connect (2)
+    GRADER_HTTP_READ_TIMEOUT     seconds allowed for one probe response (5)
+    GRADER_HTTP_UPLOAD_TIMEOUT   seconds allowed for the upload response (30)
+"""
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+READY_TIMEOUT = float(os.environ.get('GRADER_HTTP_READY_TIMEOUT', '5'))
+CONNECT_TIMEOUT = float(os.environ.get('GRADER_HTTP_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('GRADER_HTTP_READ_TIMEOUT', '5'))
+UPLOAD_TIMEOUT = float(os.environ.get('GRADER_HTTP_UPLOAD_TIMEOUT', '30'))
+# Backoff between attempts: the cap grows from INITIAL_DELAY to MAX_DELAY and
+# the actual sleep is drawn uniformly below it
+INITIAL_DELAY = 0.1
+MAX_DELAY = 1.0
+
+
+class ProbeResult:
+    """
+    Outcome of waiting for an application.
+    """
+
+    def __init__(self, ready, latency, attempts, error=None):
+        self.ready = ready
+        # Seconds from the first attempt until the application answered
+        self.latency = latency
+        self.attempts = attempts
+        # Why the last attempt failed, if it did
+        self.error = error
+
+
+def new_session():
+    """
+    A session for grading one student: one kept-alive connection per host
+    and no retries behind the probe's back.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def wait_until_ready(session, url, timeout=None):
+    """
+    GET url until it answers 200 or timeout (default READY_TIMEOUT) seconds
+    have passed.
+    """
+    timeout = READY_TIMEOUT if timeout is None else timeout
+    start_time = time.monotonic()
+    deadline = start_time + timeout
+    delay = INITIAL_DELAY
+    attempts = 0
+    error = None
+    while True:
+        remaining = deadline - time.monotonic()
+        if attempts and remaining <= 0:
+            return ProbeResult(False, time.monotonic() - start_time, attempts, error)
+        attempts += 1
+        try:
+            # Never let one attempt run far past the window
+            response = session.get(url, timeout=(
+                min(CONNECT_TIMEOUT, max(remaining, 0.1)),
+                min(READ_TIMEOUT, max(remaining, 0.1))
+            ))
+            # Read the body so the connection goes back to the pool
+            response.content
+            if response.status_code == 200:
+                return ProbeResult(True, time.monotonic() - start_time, attempts)
+            error = f"status code {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            error = type(e).__name__
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            time.sleep(min(random.uniform(0, delay), remaining))
+        delay = min(delay * 2, MAX_DELAY)
@@ -0,0 +1,247 @@
+"""
+In-memory comparison of an uploaded image with the reference image.
+
+The uploaded object is streamed from S3 into memory and decoded at reduced
+resolution: JPEGs are scaled down by libjpeg during decoding (1/2, 1/4 or 1/8)
+as far as the smaller side stays at least MIN_SIDE pixels, which is plenty
+for a 256-bin histogram.
+
+The reference side comes from a fingerprint store (the normalized histogram of
+every channel, a perceptual hash and the dimensions of valid_image.jpg), so
+grading never decodes the reference. Rebuild the store whenever the reference
+image changes:
+
+    python3 image_compare.py build
+
+GRADER_IMAGE_COMPARE selects how images are matched: "histogram" (default)
+correlates the first channel's histograms, "fingerprint" requires the
+perceptual hashes to be within PHASH_MAX_DISTANCE bits and the histograms of
+all channels to agree.
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+
+import lazy_imports
+
+cv2 = lazy_imports.lazy('cv2')
+np = lazy_imports.lazy('numpy')
+
+REFERENCE_IMAGE = 'valid_image.jpg'
+FINGERPRINT_FILE = 'valid_image.fingerprint.json'
+COMPARE_MODE = os.environ.get('GRADER_IMAGE_COMPARE', 'histogram')
+# Histogram correlation at or above which the images are considered the same
+MATCH_THRESHOLD = 0.9
+# Largest Hamming distance between the 64-bit perceptual hashes of a match
+PHASH_MAX_DISTANCE = 10
+# In fingerprint mode the hash decides; the mean correlation over all
+# channels only has to rule out recolored copies, so recompression passes
+FINGERPRINT_HIST_THRESHOLD = 0.5
+# Smallest side, in pixels, a reduced decode may produce
+MIN_SIDE = 256
+
+# Names of the cv2 flags, looked up when decoding so OpenCV loads on first use
+REDUCED_FLAGS = [
+    (8, 'IMREAD_REDUCED_COLOR_8'),
+    (4, 'IMREAD_REDUCED_COLOR_4'),
+    (2, 'IMREAD_REDUCED_COLOR_2'),
+]
+# JPEG start-of-frame markers; the frame header holds the image size
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+
+def jpeg_size(buffer):
+    """
+    Return (width, height) from a JPEG's frame header, or None if buffer is
+    not a JPEG.
+    """
+    if buffer[:2] != b'\xff\xd8':
+        return None
+    offset = 2
+    while offset + 4 <= len(buffer):
+        if buffer[offset] != 0xFF:
+            return None
+        marker = buffer[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):
+            offset += 2
+            continue
+        length = struct.unpack('>H', buffer[offset + 2:offset + 4])[0]
+        if marker in SOF_MARKERS:
+            if offset + 9 > len(buffer):
+                return None
+            height, width = struct.unpack('>HH', buffer[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + length
+    return None
+
+
+def decode_image(buffer):
+    """
+    Decode image bytes, scaled down as far as MIN_SIDE allows. Returns None
+    if the bytes are not an image.
+    """
+    flags = cv2.IMREAD_COLOR
+    size = jpeg_size(buffer)
+    if size is not None:
+        for factor, reduced_flags in REDUCED_FLAGS:
+            if min(size) // factor >= MIN_SIDE:
+                flags = getattr(cv2, reduced_flags)
+                break
+    return cv2.imdecode(np.frombuffer(buffer, dtype=np.uint8), flags)
+
+
+def histogram(image, channel=0):
+    hist = cv2.calcHist([image], [channel], None, [256], [0, 256])
+    # Flattened: OpenCV versions disagree on the shape calcHist returns
+    return cv2.normalize(hist, hist).ravel()
+
+
+def phash(image):
+    """
+    64-bit DCT perceptual hash: the signs of the lowest 8x8 frequencies of a
+    32x32 grayscale thumbnail relative to their median.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(np.float32(small))[:8, :8].flatten()
+    # The DC term only carries the mean brightness
+    bits = low > np.median(low[1:])
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class Fingerprint:
+    """
+    What grading needs to know about an image.
+    """
+
+    def __init__(self, width, height, histograms, phash):
+        self.width = width
+        self.height = height
+        self.histograms = histograms
+        self.phash = phash
+
+    @classmethod
+    def of_image(cls, image, size=None):
+        height, width = image.shape[:2]
+        if size is not None:
+            # Dimensions of the original, not of the reduced decode
+            width, height = size
+        histograms = [histogram(image, channel) for channel in range(image.shape[2])]
+        return cls(width, height, histograms, phash(image))
+
+    @classmethod
+    def from_dict(cls, d):
+        histograms = [np.array(h, dtype=np.float32) for h in d['histograms']]
+        return cls(d['width'], d['height'], histograms, int(d['phash'], 16))
+
+    def to_dict(self):
+        return {
+            'width': self.width,
+            'height': self.height,
+            'histograms': [[round(float(v), 8) for v in h] for h in self.histograms],
+            'phash': f"{self.phash:016x}",
+        }
+
+
+def build_fingerprint(image_path=REFERENCE_IMAGE, output_path=FINGERPRINT_FILE):
+    """
+    Fingerprint the reference image and write the store.
+    """
+    with open(image_path, 'rb') as f:
+        buffer = f.read()
+    image = decode_image(buffer)
+    if image is None:
+        raise ValueError(f"{image_path} is not a readable image")
+    fingerprint = Fingerprint.of_image(image, jpeg_size(buffer))
+    with open(output_path, 'w') as f:
+        json.dump(fingerprint.to_dict(), f)
+    return fingerprint
+
+
+def reference_fingerprint(path=FINGERPRINT_FILE):
+    """
+    The reference fingerprint, loaded from the store once per process. A
+    missing store is rebuilt from the reference image.
+    """
+    with _fingerprint_lock:
+        fingerprint = _fingerprints.get(path)
+        if fingerprint is None:
+            if os.path.exists(path):
+                with open(path) as f:
+                    fingerprint = Fingerprint.from_dict(json.load(f))
+            else:
+                fingerprint = build_fingerprint(output_path=path)
+            _fingerprints[path] = fingerprint
+        return fingerprint
+
+
+def read_object(s3, bucket, key):
+    """
+    Stream an S3 object into memory and return its bytes.
+    """
+    body = s3.get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        return body.read()
+    finally:
+        body.close()
+
+
+def compare_with_reference(buffer, path=FINGERPRINT_FILE):
+    """
+    Histogram correlation of the image in buffer with the reference image.
+    """
+    image = decode_image(buffer)
+    if image is None:
+        raise ValueError("the uploaded object is not a readable image")
+    reference = reference_fingerprint(path)
+    return cv2.compareHist(reference.histograms[0], histogram(image), cv2.HISTCMP_CORREL)
+
+
+def matches_reference(buffer, mode=None, path=FINGERPRINT_FILE):
+    """
+    True if the image in buffer is the reference image, compared the way
+    mode (default COMPARE_MODE) says.
+    """
+    mode = mode or COMPARE_MODE
+    if mode == 'histogram':
+        return compare_with_reference(buffer, path) >= MATCH_THRESHOLD
+    if mode != 'fingerprint':
+        raise ValueError(f"Unknown image comparison mode {mode!r}")
+    image = decode_image(buffer)
+    if image is None:
+        raise ValueError("the uploaded object is not a readable image")
+    reference = reference_fingerprint(path)
+    uploaded = Fingerprint.of_image(image)
+    if hamming(reference.phash, uploaded.phash) > PHASH_MAX_DISTANCE:
+        return False
+    correlations = [
+        cv2.compareHist(expected, actual, cv2.HISTCMP_CORREL)
+        for expected, actual in zip(reference.histograms, uploaded.histograms)
+    ]
+    return sum(correlations) / len(correlations) >= FINGERPRINT_HIST_THRESHOLD
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the reference image fingerprint store.")
+    parser.add_argument("command", choices=['build'])
+    parser.add_argument("--image", default=REFERENCE_IMAGE)
+    parser.add_argument("--output", default=FINGERPRINT_FILE)
+    args = parser.parse_args(argv)
+    fingerprint = build_fingerprint(args.image, args.output)
+    print(f"{args.output}: {fingerprint.width}x{fingerprint.height}, phash {fingerprint.phash:016x}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,45 @@
-from flask import Flask, request, redirect, url_for, render_template, flash
+from flask import Flask, Request, request, redirect, url_for, render_template, flash, session, jsonify, abort
 from werkzeug.utils import secure_filename
 import boto3
+import io
 import os
 import uuid  # for generating unique IDs
 from util import resize_image, allowed_file
 
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Pillow format for each extension; the resized image keeps the upload's type
+IMAGE_FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'gif': 'GIF'}
+CONTENT_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif'}
+MAX_IMAGE_SIZE = 2 * 1024 * 1024  # 2 MB
+# Room for the multipart framing around the image in the request body
+MAX_FORM_OVERHEAD = 64 * 1024
+# Set DIRECT_UPLOAD=1 to have browsers send images straight to the bucket
+DIRECT_UPLOAD = os.environ.get('DIRECT_UPLOAD', '0') == '1'
+PRESIGN_EXPIRY = 300  # seconds a presigned upload stays valid
+
+
+class InMemoryRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Uploads are bounded by MAX_CONTENT_LENGTH, so keep them in memory
+        # instead of spooling large ones to a temporary file
+        return io.BytesIO()
+
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.secret_key = os.environ.get('SECRET_KEY', 'Your_Secret_Key')
+# Larger requests are rejected with 413 before their body is read
+app.config['MAX_CONTENT_LENGTH'] = MAX_IMAGE_SIZE + MAX_FORM_OVERHEAD
 
-s3 = boto3.client('s3')
+# S3_ENDPOINT_URL points the app at a local S3 stand-in (MinIO, LocalStack)
+s3 = boto3.client('s3', endpoint_url=os.environ.get('S3_ENDPOINT_URL') or None)
 BUCKET_NAME = os.environ.get('BUCKET_NAME', 'Your_Bucket_Name')
 
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-MAX_IMAGE_SIZE = 2 * 1024 * 1024  # 2 MB
+
+@app.errorhandler(413)
+def request_too_large(e):
+    flash('File size exceeds maximum allowed size (2MB)', 'error')
+    return redirect(request.url)
 
 @app.route('/', methods=['GET', 'POST'])
 def upload_file():
@@ -32,40 +59,91 @@ def upload_file():
             return redirect(request.url)
 
         # Generate unique filename
-        unique_filename = 'pic_' + str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-        file_path = os.path.join(app.root_path, unique_filename)
-        file.save(file_path)
+        extension = file.filename.rsplit('.', 1)[1].lower()
+        unique_filename = 'pic_' + str(uuid.uuid4()) + '.' + extension
 
-        # Check the file size
-        if os.path.getsize(file_path) > MAX_IMAGE_SIZE:
-            os.remove(file_path)  # remove the file if it's too large
+        # Read at most one byte more than allowed, to tell if it is too large
+        image_data = file.stream.read(MAX_IMAGE_SIZE + 1)
+        if len(image_data) > MAX_IMAGE_SIZE:
             flash('File size exceeds maximum allowed size (2MB)', 'error')
             return redirect(request.url)
 
         try:
-            # Resize the image
-            resized_file_path = os.path.join(app.root_path, 'resized_' + unique_filename)
-            resize_image(file_path, resized_file_path)
+            # Resize the image in memory
+            resized = io.BytesIO()
+            resize_image(io.BytesIO(image_data), resized, format=IMAGE_FORMATS[extension])
+            resized.seek(0)
 
             # Upload to S3 with the unique filename
-            s3.upload_file(
-                Filename=resized_file_path,
-                Bucket=BUCKET_NAME,
-                Key=unique_filename
-            )
+            s3.upload_fileobj(resized, BUCKET_NAME, unique_filename)
 
             flash(f'File uploaded successfully.Image ID: {unique_filename}', 'success')
-
-            os.remove(file_path)
-            os.remove(resized_file_path)
         except Exception as e:
-            os.remove(file_path)  # ensure the file is removed in case of an error
-            os.remove(resized_file_path)
             flash(f'Error uploading file: {str(e)}', 'error')
 
         return redirect(request.url)
 
-    return render_template('upload.html', allowed_extensions=ALLOWED_EXTENSIONS, max_size_mb=MAX_IMAGE_SIZE/(1024*1024))
+    return render_template('upload.html', allowed_extensions=ALLOWED_EXTENSIONS, max_size_mb=MAX_IMAGE_SIZE/(1024*1024),
+                           direct_upload=DIRECT_UPLOAD, max_size=MAX_IMAGE_SIZE)
+
+@app.route('/presign', methods=['POST'])
+def presign_upload():
+    # Direct upload: the browser gets a presigned POST for a new key and
+    # sends the image to S3 itself, then reports back to /uploaded
+    if not DIRECT_UPLOAD:
+        abort(404)
+
+    filename = request.form.get('filename', '')
+    if not allowed_file(filename, ALLOWED_EXTENSIONS):
+        flash('Invalid file type. Only images are allowed.', 'error')
+        return jsonify(redirect=url_for('upload_file')), 400
+
+    extension = filename.rsplit('.', 1)[1].lower()
+    unique_filename = 'pic_' + str(uuid.uuid4()) + '.' + extension
+    content_type = CONTENT_TYPES[extension]
+
+    # S3 enforces the size and type limits itself
+    post = s3.generate_presigned_post(
+        BUCKET_NAME, unique_filename,
+        Fields={'Content-Type': content_type, 'success_action_status': '201'},
+        Conditions=[
+            {'Content-Type': content_type},
+            {'success_action_status': '201'},
+            ['content-length-range', 1, MAX_IMAGE_SIZE],
+        ],
+        ExpiresIn=PRESIGN_EXPIRY
+    )
+
+    # Only the key issued to this browser can be registered
+    session['pending_upload'] = unique_filename
+    return jsonify(image_id=unique_filename, url=post['url'], fields=post['fields'])
+
+@app.route('/uploaded', methods=['POST'])
+def upload_complete():
+    if not DIRECT_UPLOAD:
+        abort(404)
+
+    unique_filename = request.form.get('image_id', '')
+    if not unique_filename or unique_filename != session.pop('pending_upload', None):
+        flash('Please upload a photo first.', 'error')
+        return jsonify(redirect=url_for('upload_file')), 400
+
+    try:
+        # The browser sent the image as is; read it back and store the
+        # resized version under the same key, as the form upload does
+        original = s3.get_object(Bucket=BUCKET_NAME, Key=unique_filename)['Body'].read()
+        extension = unique_filename.rsplit('.', 1)[1].lower()
+        resized = io.BytesIO()
+        resize_image(io.BytesIO(original), resized, format=IMAGE_FORMATS[extension])
+        resized.seek(0)
+        s3.upload_fileobj(resized, BUCKET_NAME, unique_filename,
+                          ExtraArgs={'ContentType': CONTENT_TYPES[extension]})
+    except Exception as e:
+        flash(f'Error uploading file: {str(e)}', 'error')
+        return jsonify(redirect=url_for('upload_file')), 400
+
+    flash(f'File uploaded successfully.Image ID: {unique_filename}', 'success')
+    return jsonify(image_id=unique_filename, redirect=url_for('upload_file'))
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,55 @@
+// Direct-to-S3 upload, used when the app runs with DIRECT_UPLOAD=1.
+//
+// The browser asks the app for a presigned POST, sends the image straight to
+// the bucket and then tells the app it has arrived, so the image never passes
+// through the Flask process. Whatever this path cannot handle (no file, a file
+// over the size limit, a bucket without CORS for this origin) falls back to
+// the normal form submission, which reports it as before.
+
+function formData(fields) {
+    const data = new FormData();
+    for (const [name, value] of Object.entries(fields)) {
+        data.append(name, value);
+    }
+    return data;
+}
+
+async function postToApp(url, fields) {
+    const response = await fetch(url, {method: 'POST', body: formData(fields), credentials: 'same-origin'});
+    return response.json();
+}
+
+async function uploadDirect(form, file) {
+    const presigned = await postToApp(form.dataset.presignUrl, {filename: file.name});
+    if (!presigned.url) {
+        return presigned;
+    }
+    const upload = formData(presigned.fields);
+    // S3 ignores any field after the file
+    upload.append('file', file);
+    await fetch(presigned.url, {method: 'POST', body: upload});
+    // The app checks the bucket itself, so a rejected upload is reported too
+    return postToApp(form.dataset.uploadedUrl, {image_id: presigned.image_id});
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.querySelector('form[data-presign-url]');
+    if (!form) {
+        return;
+    }
+    form.addEventListener('submit', async (event) => {
+        const file = form.elements.file.files[0];
+        if (!file || file.size > Number(form.dataset.maxSize)) {
+            return;
+        }
+        event.preventDefault();
+        let result;
+        try {
+            result = await uploadDirect(form, file);
+        } catch (error) {
+            form.submit();
+            return;
+        }
+        window.location = result.redirect;
+    });
+});
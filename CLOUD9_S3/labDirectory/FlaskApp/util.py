@@ -1,14 +1,75 @@
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
 import os
 
+# Encoder settings for thumbnails; Pillow's own JPEG default is 75
+JPEG_QUALITY = 85
+# Resample from an image at least this many times the target size, so the
+# final filter pass is cheap without visible aliasing
+REDUCING_GAP = 2.0
 
-def resize_image(input_path, output_path, size=(300, 300)):
+
+def resize_image(input_path, output_path, size=(300, 300), format=None, quality=JPEG_QUALITY):
     """
     Resize the input image and save it to the output path.
+
+    Both may be paths or file objects; saving to a file object needs the
+    Pillow format (e.g. 'JPEG'), which a path otherwise implies. JPEGs are
+    decoded at a reduced scale (draft mode) when the thumbnail is small
+    enough, and the EXIF orientation is applied so the thumbnail is upright.
     """
     with Image.open(input_path) as img:
-        img.thumbnail(size)
-        img.save(output_path)
+        # Orientation may swap width and height, so draft for the larger
+        # side; keep REDUCING_GAP times the target, as thumbnail() expects
+        side = int(max(size) * REDUCING_GAP)
+        img.draft(None, (side, side))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail(size, reducing_gap=REDUCING_GAP)
+        if format is None and isinstance(output_path, (str, os.PathLike)):
+            format = Image.registered_extensions().get(os.path.splitext(output_path)[1].lower())
+        if format == 'JPEG' and img.mode not in ('RGB', 'L', 'CMYK'):
+            img = img.convert('RGB')
+        options = {'quality': quality} if format in ('JPEG', 'WEBP') else {}
+        img.save(output_path, format=format, **options)
+
+
+def _resize_one(job):
+    input_path, output_path, size, quality = job
+    try:
+        resize_image(input_path, output_path, size, quality=quality)
+        return input_path, output_path, None
+    except Exception as e:
+        return input_path, output_path, str(e)
+
+
+def resize_images(inputs, output_dir, size=(300, 300), quality=JPEG_QUALITY, workers=None):
+    """
+    Resize many images in parallel, one process per core (or workers).
+
+    inputs is a directory, whose files with image extensions are resized, or
+    an iterable of paths. Each thumbnail is written to output_dir under the
+    name of its input. Returns (input, output, error) for every image, error
+    being None when it succeeded.
+    """
+    if isinstance(inputs, (str, os.PathLike)):
+        directory = inputs
+        extensions = Image.registered_extensions()
+        inputs = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.splitext(name)[1].lower() in extensions
+        )
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [
+        (path, os.path.join(output_dir, os.path.basename(path)), size, quality)
+        for path in inputs
+    ]
+    if not jobs:
+        return []
+    workers = workers or os.cpu_count() or 1
+    # A few batches per process keep the pool busy with little IPC
+    chunksize = max(1, len(jobs) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_resize_one, jobs, chunksize=chunksize))
 
 
 def allowed_file(filename, allowed_extensions):
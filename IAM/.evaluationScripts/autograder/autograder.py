@@ -1,53 +1,115 @@
 import json
-import boto3
-from botocore.exceptions import ClientError
+import os
+import threading
+import aws_clients
+import lazy_imports
 
-def read_data():
+botocore_exceptions = lazy_imports.lazy('botocore.exceptions')
+
+TEST_CASES = [
+    {
+        'testid': 'S3 Permissions',
+        'allowed': [ "s3:ListAllMyBuckets", "s3:CreateBucket", "s3:GetObject", "s3:DeleteObject"],
+        'denied': ['s3:DeleteBucket', 's3:PutObject']
+    },
+    {
+        'testid': 'EC2 Permissions',
+        'allowed': ['ec2:DescribeInstances', 'ec2:DescribeVpcs', 'ec2:DescribeSecurityGroups'],
+        'denied': [ "ec2:StartInstances", "ec2:StopInstances"]
+    },
+    {
+        'testid': 'Load Balancer Permissions',
+        'allowed': [ "elasticloadbalancing:CreateLoadBalancer", "elasticloadbalancing:DeleteLoadBalancer"],
+        'denied': ["elasticloadbalancing:DescribeLoadBalancers"]
+    },
+    {
+        'testid': 'Lambda Permissions',
+        'allowed': [ "lambda:CreateFunction", "lambda:InvokeFunction"],
+        'denied': ["lambda:DeleteFunction", "lambda:UpdateFunctionCode"]
+    },
+    {
+        'testid': 'CloudWatch Permissions',
+        'allowed': [ "logs:CreateLogGroup", "logs:GetLogEvents"],
+        'denied': ["logs:DeleteLogGroup", "logs:PutLogEvents"]
+    }
+]
+
+# IAM rate limits are account-wide, so user lookups are cached for the life
+# of the process (batch runs and regrades look up the same users again)
+_user_names = {}
+_users = {}
+_user_cache_lock = threading.Lock()
+
+def read_data(path='data.json'):
     try:
-        with open('data.json') as f:
+        with open(path) as f:
             return json.load(f)
     except Exception as e:
         return {"error": f"Error reading data.json: {e}"}
 
 def get_iam_client(access_key, secret_key, region):
     try:
-        session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-        return session.client('iam')
+        return aws_clients.get_client('iam', access_key, secret_key, region)
     except Exception as e:
         return None
 
 def get_user_name(iam_client, access_key):
+    with _user_cache_lock:
+        if access_key in _user_names:
+            return _user_names[access_key]
     try:
         response = iam_client.get_access_key_last_used(AccessKeyId=access_key)
-        return response['UserName']
-    except ClientError as e:
+        user_name = response['UserName']
+    except botocore_exceptions.ClientError as e:
         return None
+    with _user_cache_lock:
+        _user_names[access_key] = user_name
+    return user_name
 
-def check_policy_attachment(iam_client, user_name, policy_arn):
+def get_user(iam_client, access_key, user_name):
+    # Keyed by access key: students in different accounts share user names
+    key = (access_key, user_name)
+    with _user_cache_lock:
+        if key in _users:
+            return _users[key]
+    user = iam_client.get_user(UserName=user_name)['User']
+    with _user_cache_lock:
+        _users[key] = user
+    return user
+
+def get_user_arn(iam_client, access_key, user_name):
+    return get_user(iam_client, access_key, user_name)['Arn']
+
+def list_attached_policies(iam_client, user_name):
+    """
+    ARNs of the managed policies attached to the user, or None on failure.
+    """
     try:
-        response = iam_client.list_attached_user_policies(UserName=user_name)
-        for policy in response.get('AttachedPolicies', []):
-            if policy['PolicyArn'] == policy_arn:
-                return True
-        return False
-    except ClientError as e:
-        return False
+        policy_arns = []
+        paginator = iam_client.get_paginator('list_attached_user_policies')
+        for page in paginator.paginate(UserName=user_name):
+            for policy in page.get('AttachedPolicies', []):
+                policy_arns.append(policy['PolicyArn'])
+        return policy_arns
+    except botocore_exceptions.ClientError as e:
+        return None
 
 def simulate_actions(iam_client, user_arn, actions):
+    """
+    Simulate every action in one paginated request and return a mapping of
+    action name (lower-cased) to its EvalDecision, or None on failure.
+    """
     try:
-        response = iam_client.simulate_principal_policy(
-            PolicySourceArn=user_arn,
-            ActionNames=actions
-        )
-        return response.get('EvaluationResults', [])
-    except ClientError as e:
+        decisions = {}
+        paginator = iam_client.get_paginator('simulate_principal_policy')
+        for page in paginator.paginate(PolicySourceArn=user_arn, ActionNames=actions):
+            for res in page.get('EvaluationResults', []):
+                decisions[res['EvalActionName'].lower()] = res.get('EvalDecision')
+        return decisions
+    except botocore_exceptions.ClientError as e:
         return None
 
-def evaluate_test_case(iam_client, user_arn, allowed_actions, denied_actions, testid):
+def evaluate_test_case(decisions, allowed_actions, denied_actions, testid):
     result = {
         'testid': testid,
         'status': 'failure',
@@ -58,23 +120,21 @@ def evaluate_test_case(iam_client, user_arn, allowed_actions, denied_actions, te
     try:
         # Check allowed actions
         if allowed_actions:
-            allowed_results = simulate_actions(iam_client, user_arn, allowed_actions)
-            if allowed_results is None:
+            if decisions is None:
                 result['message'] = 'Failed to simulate allowed actions'
                 return result
-            for res in allowed_results:
-                if res.get('EvalDecision') != 'allowed':
+            for action in allowed_actions:
+                if decisions.get(action.lower()) != 'allowed':
                     result['message'] = 'Permissions not correctly configured'
                     return result
         
         # Check denied actions
         if denied_actions:
-            denied_results = simulate_actions(iam_client, user_arn, denied_actions)
-            if denied_results is None:
+            if decisions is None:
                 result['message'] = 'Failed to simulate denied actions'
                 return result
-            for res in denied_results:
-                if res.get('EvalDecision') == 'allowed':
+            for action in denied_actions:
+                if decisions.get(action.lower()) == 'allowed':
                     result['message'] = 'Permissions not correctly configured'
                     return result
         
@@ -85,9 +145,8 @@ def evaluate_test_case(iam_client, user_arn, allowed_actions, denied_actions, te
         result['message'] = f"Test case error: {str(e)}"
     return result
 
-def main():
+def grade(student_data):
     data = []
-    student_data = read_data()
     if not student_data or 'ACCESS_KEY_ID' not in student_data:
         data.append({
             'testid': 'Policy Attachment',
@@ -105,9 +164,7 @@ def main():
                 'maximum marks': 1,
                 'message': 'Invalid data.json'
             })
-        with open('evaluate.json', 'w') as f:
-            json.dump({'data': data}, f, indent=4)
-        return
+        return data
     
     access_key = student_data['ACCESS_KEY_ID']
     secret_key = student_data['SECRET_ACCESS_KEY']
@@ -132,9 +189,7 @@ def main():
                 'maximum marks': 1,
                 'message': 'IAM client initialization failed'
             })
-        with open('evaluate.json', 'w') as f:
-            json.dump({'data': data}, f, indent=4)
-        return
+        return data
     
     user_name = get_user_name(iam_client, access_key)
     if not user_name:
@@ -154,11 +209,10 @@ def main():
                 'maximum marks': 1,
                 'message': 'User name retrieval failed'
             })
-        with open('evaluate.json', 'w') as f:
-            json.dump({'data': data}, f, indent=4)
-        return
+        return data
     
-    is_attached = check_policy_attachment(iam_client, user_name, policy_arn)
+    attached_policies = list_attached_policies(iam_client, user_name)
+    is_attached = attached_policies is not None and policy_arn in attached_policies
     policy_test = {
         'testid': 'Policy Attachment',
         'status': 'success' if is_attached else 'failure',
@@ -178,14 +232,11 @@ def main():
                 'maximum marks': 1,
                 'message': f'Policy {policy_arn} is not attached to user {user_name}'
             })
-        with open('evaluate.json', 'w') as f:
-            json.dump({'data': data}, f, indent=4)
-        return
+        return data
     
     try:
-        user = iam_client.get_user(UserName=user_name)
-        user_arn = user['User']['Arn']
-    except ClientError as e:
+        user_arn = get_user_arn(iam_client, access_key, user_name)
+    except botocore_exceptions.ClientError as e:
         data.append({
             'testid': 'Policy Attachment',
             'status': 'failure',
@@ -202,50 +253,37 @@ def main():
                 'maximum marks': 1,
                 'message': 'User ARN retrieval failed'
             })
-        with open('evaluate.json', 'w') as f:
-            json.dump({'data': data}, f, indent=4)
-        return
-    
-    test_cases = [
-        {
-            'testid': 'S3 Permissions',
-            'allowed': [ "s3:ListAllMyBuckets", "s3:CreateBucket", "s3:GetObject", "s3:DeleteObject"],
-            'denied': ['s3:DeleteBucket', 's3:PutObject']
-        },
-        {
-            'testid': 'EC2 Permissions',
-            'allowed': ['ec2:DescribeInstances', 'ec2:DescribeVpcs', 'ec2:DescribeSecurityGroups'],
-            'denied': [ "ec2:StartInstances", "ec2:StopInstances"]
-        },
-        {
-            'testid': 'Load Balancer Permissions',
-            'allowed': [ "elasticloadbalancing:CreateLoadBalancer", "elasticloadbalancing:DeleteLoadBalancer"],
-            'denied': ["elasticloadbalancing:DescribeLoadBalancers"]
-        },
-        {
-            'testid': 'Lambda Permissions',
-            'allowed': [ "lambda:CreateFunction", "lambda:InvokeFunction"],
-            'denied': ["lambda:DeleteFunction", "lambda:UpdateFunctionCode"]
-        },
-        {
-            'testid': 'CloudWatch Permissions',
-            'allowed': [ "logs:CreateLogGroup", "logs:GetLogEvents"],
-            'denied': ["logs:DeleteLogGroup", "logs:PutLogEvents"]
-        }
-    ]
-
-    for tc in test_cases:
+        return data
+
+    # One simulation request covers the actions of every test case. It sees
+    # everything the user gets (attached, inline and group policies and any
+    # boundary), which grading the attached document alone cannot.
+    actions = []
+    for tc in TEST_CASES:
+        for action in tc['allowed'] + tc['denied']:
+            if action not in actions:
+                actions.append(action)
+    decisions = simulate_actions(iam_client, user_arn, actions)
+
+    for tc in TEST_CASES:
         test_result = evaluate_test_case(
-            iam_client,
-            user_arn,
+            decisions,
             tc['allowed'],
             tc['denied'],
             tc['testid']
         )
         data.append(test_result)
-    
+    return data
+
+def evaluate(lab_directory='.'):
+    """
+    Grade the submission in lab_directory and return the evaluate.json payload.
+    """
+    return {'data': grade(read_data(os.path.join(lab_directory, 'data.json')))}
+
+def main():
     with open('../evaluate.json', 'w') as f:
-        json.dump({'data': data}, f, indent=4)
+        json.dump(evaluate(), f, indent=4)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
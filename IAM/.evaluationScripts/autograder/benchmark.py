@@ -0,0 +1,282 @@
+"""
+Benchmark a lab's grader.
+
+Grades a roster with batch.py at several worker counts, each in a fresh
+process, and writes one machine-readable report covering per-check wall time,
+AWS API calls and response bytes by operation, HTTP and SSH round trips to the
+student's machines, peak RSS and students per second:
+
+    python3 benchmark.py --roster roster.jsonl --workers 1 4 16 --output benchmark.json
+
+Recorded fixtures are replayed by passing the fixture file of the roster with
+--fixtures. With --lab and --students a synthetic class is generated with
+local_backend instead (labs that make AWS calls only):
+
+    python3 benchmark.py --lab vpc --students 500 --workers 1 8 32 --output benchmark.json
+
+Compare reports of two revisions to spot regressions.
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Grader functions that are timed, per lab directory: the checks and the
+# steps that feed them. 'module.function' names a function the grader calls
+# through one of its helper modules. A name that no longer exists fails the
+# run, so the list cannot silently go stale.
+TIMED_FUNCTIONS = {
+    'VPC': [
+        'fetch_topology', 'check_vpc', 'check_igw', 'check_public_subnet', 'check_private_subnet',
+        'check_public_route_table', 'check_public_route_associations',
+    ],
+    'IAM': [
+        'get_user_name', 'get_user_arn', 'list_attached_policies', 'simulate_actions', 'evaluate_test_case',
+    ],
+    'CLOUD9_S3': [
+        'http_probe.wait_until_ready', 'upload_image_and_get_id', 'flash_messages.find_image_id',
+        'check_bucket', 'image_compare.read_object', 'image_compare.matches_reference',
+    ],
+    'Rekognition_Lambda': [
+        'http_probe.wait_until_ready', 'upload_image_and_get_id', 'check_bucket', 'image_compare.read_object',
+        'image_compare.matches_reference', 'check_label_bucket', 'check_lambda_trigger', 'poll',
+        'log_fetch.search_streams',
+    ],
+    'VM-SSH': [
+        'connect', 'run_probe', 'check_ssh_log', 'check_private_ip', 'check_user_data', 'check_flask_app',
+    ],
+}
+
+
+class Stats:
+    """
+    Thread-safe accumulator for one benchmark run.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_timing(self, name, seconds):
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def add_call(self, service, operation, size=0):
+        key = f"{service}.{operation}"
+        with self._lock:
+            self.calls[key] += 1
+            self.bytes[key] += size
+
+    def report(self):
+        checks = {}
+        for name, samples in sorted(self.timings.items()):
+            samples = sorted(samples)
+            checks[name] = {
+                "calls": len(samples),
+                "total_s": round(sum(samples), 6),
+                "mean_s": round(sum(samples) / len(samples), 6),
+                "p50_s": round(samples[len(samples) // 2], 6),
+                "p95_s": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)], 6),
+                "max_s": round(samples[-1], 6),
+            }
+        return {
+            "checks": checks,
+            "api_calls": dict(sorted(self.calls.items())),
+            "api_bytes": dict(sorted(self.bytes.items())),
+        }
+
+
+def lab_name():
+    """
+    Name of the lab directory this copy of the benchmark belongs to.
+    """
+    lab_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.basename(lab_dir)
+
+
+def timed(stats, name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.add_timing(name, time.perf_counter() - start_time)
+    return wrapper
+
+
+def instrument(stats):
+    """
+    Wrap the grader's check functions and the HTTP, SSH and AWS call paths
+    so that every call is recorded in stats.
+    """
+    import autograder
+
+    for name in TIMED_FUNCTIONS[lab_name()]:
+        module_name, _, function_name = name.rpartition('.')
+        module = importlib.import_module(module_name) if module_name else autograder
+        setattr(module, function_name, timed(stats, name, getattr(module, function_name)))
+
+    try:
+        import aws_clients
+    except ImportError:
+        pass
+    else:
+        aws_clients.add_call_listener(stats.add_call)
+
+    import requests
+    send = requests.Session.send
+
+    def counted_send(self, request, **kwargs):
+        response = send(self, request, **kwargs)
+        if kwargs.get('stream'):
+            size = int(response.headers.get('Content-Length', 0))
+        else:
+            size = len(response.content)
+        stats.add_call('http', request.method, size)
+        return response
+    requests.Session.send = counted_send
+
+    try:
+        import ssh_pool
+    except ImportError:
+        pass
+    else:
+        ssh_client = ssh_pool.paramiko.SSHClient
+        for method in ('connect', 'exec_command'):
+            original = getattr(ssh_client, method)
+
+            def counted(self, *args, _original=original, _method=method, **kwargs):
+                stats.add_call('ssh', _method)
+                return _original(self, *args, **kwargs)
+            setattr(ssh_client, method, counted)
+
+
+def run_once(roster_path, workers):
+    """
+    Grade the roster in this process and return the report of the run.
+    """
+    import batch
+
+    stats = Stats()
+    instrument(stats)
+    if batch.aws_clients is not None:
+        batch.aws_clients.configure(max_pool_connections=max(workers, batch.aws_clients.MAX_POOL_CONNECTIONS))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'results.jsonl')
+        start_time = time.monotonic()
+        count = batch.run_batch(roster_path, output_path, workers=workers)
+        elapsed = time.monotonic() - start_time
+        score = maximum = 0
+        with open(output_path) as f:
+            for line in f:
+                record = json.loads(line)
+                score += record["score"]
+                maximum += record["maximum marks"]
+
+    report = {
+        "workers": workers,
+        "students": count,
+        "seconds": round(elapsed, 3),
+        "students_per_second": round(count / elapsed, 2) if elapsed else None,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "score": score,
+        "maximum marks": maximum,
+    }
+    report.update(stats.report())
+    return report
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def generate_class(lab, students, tmp_dir):
+    """
+    Write a synthetic roster and fixture file and return their paths.
+    """
+    try:
+        import local_backend
+    except ImportError:
+        sys.exit("This lab has no local stand-in; benchmark it with a recorded --roster")
+    world, roster = local_backend.generate(lab, students, app_port=free_port())
+    fixtures_path = os.path.join(tmp_dir, 'fixtures.json')
+    roster_path = os.path.join(tmp_dir, 'roster.jsonl')
+    world.to_file(fixtures_path)
+    with open(roster_path, 'w') as f:
+        for payload in roster:
+            f.write(json.dumps(payload) + "\n")
+    return roster_path, fixtures_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the grader at several worker counts.")
+    parser.add_argument("--roster", help="JSONL roster to grade (recorded fixtures)")
+    parser.add_argument("--fixtures", help="local_backend fixture file the roster was recorded against")
+    parser.add_argument("--lab", choices=['vpc', 'iam', 'cloud9', 'rekognition'],
+                        help="generate a synthetic class for this lab instead of --roster")
+    parser.add_argument("--students", type=int, default=200, help="size of the synthetic class")
+    parser.add_argument("--workers", type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument("--output", default="benchmark.json", help="where to write the JSON report")
+    parser.add_argument("--single", action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        # Child process: one worker count, report on stdout
+        json.dump(run_once(args.roster, args.workers[0]), sys.stdout)
+        return
+    if not args.roster and not args.lab:
+        parser.error("either --roster or --lab is required")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        roster_path, fixtures_path = args.roster, args.fixtures
+        if args.lab:
+            roster_path, fixtures_path = generate_class(args.lab, args.students, tmp_dir)
+        env = dict(os.environ)
+        if fixtures_path:
+            env['GRADER_LOCAL_FIXTURES'] = os.path.abspath(fixtures_path)
+
+        runs = []
+        for workers in args.workers:
+            # A fresh process per run keeps peak RSS and caches independent
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single",
+                 "--roster", os.path.abspath(roster_path), "--workers", str(workers)],
+                env=env, stdout=subprocess.PIPE, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            run = json.loads(child.stdout)
+            runs.append(run)
+            print(f"{workers:>4} workers: {run['students_per_second']} students/s, "
+                  f"peak RSS {run['peak_rss_kb'] // 1024} MiB", file=sys.stderr)
+
+    report = {
+        "lab": lab_name(),
+        "started": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "python": platform.python_version(),
+        "roster": args.roster,
+        "synthetic": {"lab": args.lab, "students": args.students} if args.lab else None,
+        "local_backend": bool(fixtures_path),
+        "runs": runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Local evaluation of IAM identity policy documents.
+
+Implements the parts of the IAM evaluation logic the lab exercises: explicit
+Deny beats Allow, anything not allowed is implicitly denied, and Action /
+NotAction / Resource / NotResource entries may use the * and ? wildcards.
+Anything the local engine cannot decide exactly (statements with a Condition,
+or resource-scoped statements, which depend on the resource the simulator
+picks) is reported as ambiguous. The grader itself always asks the AWS policy
+simulator, which also sees inline, group and boundary policies; this module
+checks a draft policy offline and backs the local IAM stand-in.
+
+    python3 policy_eval.py sample_iam_policy.json
+"""
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+ALLOWED = 'allowed'
+EXPLICIT_DENY = 'explicitDeny'
+IMPLICIT_DENY = 'implicitDeny'
+
+# Compiled policies kept per process, keyed by a hash of the document
+CACHE_SIZE = 256
+
+
+def strip_comments(text):
+    """
+    Remove // line comments, which the lab's policy template uses, while
+    leaving // inside JSON strings alone.
+    """
+    out = []
+    in_string = escaped = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end
+            continue
+        out.append(ch)
+        i += 1
+    return ''.join(out)
+
+
+def load_policy(source):
+    """
+    Return a policy document from a dict, a JSON string or an open file.
+    """
+    if isinstance(source, dict):
+        return source
+    if hasattr(source, 'read'):
+        source = source.read()
+    return json.loads(strip_comments(source))
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def wildcard_matcher(patterns, ignore_case=False):
+    """
+    Compile IAM wildcard patterns into one regular expression.
+    """
+    parts = [re.escape(p).replace(r'\*', '.*').replace(r'\?', '.') for p in patterns]
+    flags = re.IGNORECASE if ignore_case else 0
+    return re.compile('^(?:' + '|'.join(parts) + ')$', flags) if parts else None
+
+
+class Statement:
+    def __init__(self, statement):
+        self.effect = statement.get('Effect')
+        if self.effect not in ('Allow', 'Deny'):
+            raise ValueError(f"Statement {statement.get('Sid', '')!r} has invalid Effect {self.effect!r}")
+        if 'Action' in statement:
+            self.not_action = False
+            self.actions = wildcard_matcher(as_list(statement['Action']), ignore_case=True)
+        elif 'NotAction' in statement:
+            self.not_action = True
+            self.actions = wildcard_matcher(as_list(statement['NotAction']), ignore_case=True)
+        else:
+            raise ValueError(f"Statement {statement.get('Sid', '')!r} has neither Action nor NotAction")
+        if 'NotResource' in statement:
+            self.not_resource = True
+            self.resources = as_list(statement['NotResource'])
+        else:
+            self.not_resource = False
+            self.resources = as_list(statement.get('Resource', '*'))
+        self.resource_matcher = wildcard_matcher(self.resources)
+        self.conditional = bool(statement.get('Condition'))
+
+    def matches_action(self, action):
+        matched = self.actions is not None and self.actions.match(action) is not None
+        return matched != self.not_action
+
+    def matches_resource(self, resource):
+        """
+        True or False, or None when the outcome depends on the concrete
+        resource the simulator would evaluate.
+        """
+        if resource == '*' and self.resources != ['*']:
+            return None
+        matched = self.resource_matcher is not None and self.resource_matcher.match(resource) is not None
+        return matched != self.not_resource
+
+    def applies(self, action, resource):
+        """
+        True, False, or None when it cannot be decided locally.
+        """
+        if not self.matches_action(action):
+            return False
+        matched = self.matches_resource(resource)
+        if matched is False:
+            return False
+        if matched is None or self.conditional:
+            return None
+        return True
+
+
+class Policy:
+    def __init__(self, document):
+        statements = document.get('Statement', [])
+        if isinstance(statements, dict):
+            statements = [statements]
+        self.statements = [Statement(statement) for statement in statements]
+
+    def evaluate(self, action, resource='*'):
+        """
+        Return 'allowed', 'explicitDeny' or 'implicitDeny', or None when the
+        decision depends on conditions or resources.
+        """
+        allowed = maybe_allowed = maybe_denied = False
+        for statement in self.statements:
+            applies = statement.applies(action, resource)
+            if applies and statement.effect == 'Deny':
+                return EXPLICIT_DENY
+            if applies:
+                allowed = True
+            elif applies is None and statement.effect == 'Deny':
+                maybe_denied = True
+            elif applies is None:
+                maybe_allowed = True
+        if maybe_denied or (maybe_allowed and not allowed):
+            return None
+        return ALLOWED if allowed else IMPLICIT_DENY
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compile_policy(document):
+    """
+    Return the compiled Policy for a document, reusing earlier compilations.
+    """
+    document = load_policy(document)
+    key = hashlib.sha256(json.dumps(document, sort_keys=True).encode()).hexdigest()
+    with _cache_lock:
+        policy = _cache.get(key)
+        if policy is not None:
+            _cache.move_to_end(key)
+            return policy
+    policy = Policy(document)
+    with _cache_lock:
+        _cache[key] = policy
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return policy
+
+
+def evaluate_test_case(policy, allowed_actions, denied_actions):
+    """
+    True if every allowed action is allowed and every denied action is not,
+    False if any action is decided the wrong way, None if undecidable.
+    """
+    ambiguous = False
+    for action in allowed_actions:
+        decision = policy.evaluate(action)
+        if decision is None:
+            ambiguous = True
+        elif decision != ALLOWED:
+            return False
+    for action in denied_actions:
+        decision = policy.evaluate(action)
+        if decision is None:
+            ambiguous = True
+        elif decision == ALLOWED:
+            return False
+    return None if ambiguous else True
+
+
+def main(argv=None):
+    from autograder import TEST_CASES
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print("usage: python3 policy_eval.py POLICY_JSON", file=sys.stderr)
+        sys.exit(2)
+    try:
+        with open(argv[0]) as f:
+            policy = compile_policy(f)
+    except ValueError as e:
+        print(f"Cannot evaluate {argv[0]}: {e}", file=sys.stderr)
+        sys.exit(1)
+    for tc in TEST_CASES:
+        verdict = evaluate_test_case(policy, tc['allowed'], tc['denied'])
+        label = {True: 'correct', False: 'incorrect', None: 'needs simulator'}[verdict]
+        print(f"{tc['testid']}: {label}")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,39 @@
-import requests
-from bs4 import BeautifulSoup
 import json
-import boto3
-import cv2
 import os
-from botocore.exceptions import NoCredentialsError, ClientError
 import time
-
-
-def upload_image_and_get_id(data):
+import aws_clients
+import http_probe
+import image_compare
+import multipart
+import lazy_imports
+import log_fetch
+
+botocore_exceptions = lazy_imports.lazy('botocore.exceptions')
+
+# Seconds from the upload the Lambda has to write the labels object and its
+# logs; the label and log checks share this one window
+LAMBDA_TIMEOUT = float(os.environ.get('GRADER_LAMBDA_TIMEOUT', '15'))
+# Logs are searched from this many seconds before the upload, for clock skew
+LOG_CLOCK_SKEW = 60
+
+
+def poll(attempt, deadline, initial_delay=0.25, max_delay=2.0):
+    """
+    Call attempt() with exponential backoff until it returns something truthy
+    or the deadline (a time.monotonic() value) has passed, and return its last
+    result. attempt() is always called at least once.
+    """
+    delay = initial_delay
+    while True:
+        result = attempt()
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def upload_image_and_get_id(data, config_data):
     result = {
         "testid": "Photo Upload Check",
         "status": "failure",
@@ -18,26 +43,31 @@ def upload_image_and_get_id(data):
     }
     try:
         # Read the application configuration
-        with open('data.json', 'r') as file:
-            config_data = json.load(file)
-            url = f"http://{config_data['public_ip']}:{config_data['port']}/"
-        # Check if the URL is accessible
-        start_time = time.time()
-        while time.time() - start_time < 5:
-            try: 
-                response = requests.get(url)
-                if response.status_code == 200: 
-                    break 
-            except requests.exceptions.RequestException: 
-                time.sleep(1) 
-        else: 
-            result['message'] = f"Error: Failed to connect to the application at {url} within 5 seconds." 
-            data.append(result) 
-            return None
-
-        # Upload the image
-        files = {'file': ('valid_image.jpg', open('valid_image.jpg', 'rb'), 'image/jpeg')}
-        response = requests.post(url, files=files)
+        if config_data is None:
+            raise FileNotFoundError('data.json')
+        if isinstance(config_data, Exception):
+            # data.json could not be parsed; report why
+            raise config_data
+        url = f"http://{config_data['public_ip']}:{config_data['port']}/"
+        with http_probe.new_session() as session:
+            # Wait for the application to answer, with bounded attempts
+            probe = http_probe.wait_until_ready(session, url)
+            result['probe latency'] = round(probe.latency, 3)
+            if not probe.ready:
+                result['message'] = (f"Error: Failed to connect to the application at {url} within "
+                                     f"{http_probe.READY_TIMEOUT:g} seconds ({probe.error}).")
+                data.append(result)
+                return None
+
+            # Upload the image over the connection the probe opened, streamed
+            # from the shared mapping of the reference image
+            body = multipart.MultipartBody('file', 'valid_image.jpg', multipart.mapped_file('valid_image.jpg'), 'image/jpeg')
+            response = session.post(
+                url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=(http_probe.CONNECT_TIMEOUT, http_probe.UPLOAD_TIMEOUT)
+            )
 
         # Extract the image ID from the response URL
         if response.url and 'image_id' in response.url:
@@ -65,7 +95,7 @@ def upload_image_and_get_id(data):
 
 
 
-def check_bucket(data, uploaded_image_name):
+def check_bucket(data, config_data, uploaded_image_name):
     result = {
         "testid": "S3 Bucket Check",
         "status": "failure",
@@ -74,64 +104,36 @@ def check_bucket(data, uploaded_image_name):
         "message": ""
     }
     try:
-        # Load the data.json file
-        with open('data.json') as f:
-            config_data = json.load(f)
-
         # Extract the necessary information
         access_key = config_data['INSTRUCTOR Access key ID']
         secret_key = config_data['INSTRUCTOR Secret Access Key']
         bucket_name = config_data['source s3 bucket name']
         region = config_data['Region']
 
-        # Create a session using the provided IAM user credentials
-        session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        # Create an S3 resource object using the above session
-        s3 = session.resource('s3')
+        # Reuse the shared S3 client for these credentials
+        s3 = aws_clients.get_client('s3', access_key, secret_key, region)
 
         # Check if the bucket exists
         try:
-            s3.meta.client.head_bucket(Bucket=bucket_name)
-        except ClientError:
+            s3.head_bucket(Bucket=bucket_name)
+        except botocore_exceptions.ClientError:
             result["message"]= f'Bucket {bucket_name} does not exist.'
             data.append(result)
             return False
-        # Download the uploaded image
+        # Stream the uploaded image into memory; nothing touches the disk
         try:
-            s3.Bucket(bucket_name).download_file(uploaded_image_name, 'uploaded_image.jpg')
-        except NoCredentialsError:
+            uploaded_image = image_compare.read_object(s3, bucket_name, uploaded_image_name)
+        except botocore_exceptions.NoCredentialsError:
             result["message"]= "Credentials not available"
             data.append(result)
             return False
-        except ClientError:
+        except botocore_exceptions.ClientError:
             result["message"]= f"Object {uploaded_image_name} does not exist in the bucket."
             data.append(result)
             return False
 
-        # Load the input image and the downloaded image
-        input_image = cv2.imread('valid_image.jpg')
-        uploaded_image = cv2.imread('uploaded_image.jpg')
-
-        # Resize the input image to match the size of the uploaded image
-        resized_input_image = cv2.resize(input_image, (uploaded_image.shape[1], uploaded_image.shape[0]))
-
-        # Calculate the histograms of the images
-        hist_input_image = cv2.calcHist([resized_input_image], [0], None, [256], [0, 256])
-        hist_uploaded_image = cv2.calcHist([uploaded_image], [0], None, [256], [0, 256])
-
-        # Normalize the histograms
-        hist_input_image = cv2.normalize(hist_input_image, hist_input_image)
-        hist_uploaded_image = cv2.normalize(hist_uploaded_image, hist_uploaded_image)
-
-        # Compare the histograms
-        comparison = cv2.compareHist(hist_input_image, hist_uploaded_image, cv2.HISTCMP_CORREL)
-        
-        if comparison >= 0.9:
+        # Compare the uploaded image with the stored reference fingerprint
+        if image_compare.matches_reference(uploaded_image):
             result['status'] = "success"
             result['score'] = 1
             result["message"]= "Bucket Checked Successfully"
@@ -152,7 +154,7 @@ def check_bucket(data, uploaded_image_name):
     data.append(result)
     return False
 
-def check_label_bucket(data, image_name):
+def check_label_bucket(data, config_data, image_name, deadline=None):
     result = {
         "testid": "Label Bucket Check",
         "status": "failure",
@@ -161,43 +163,45 @@ def check_label_bucket(data, image_name):
         "message": ""
     }
     try:
-        # Load the data.json file
-        with open('data.json') as f:
-            config_data = json.load(f)
-
         # Extract the necessary information
         access_key = config_data['INSTRUCTOR Access key ID']
         secret_key = config_data['INSTRUCTOR Secret Access Key']
         bucket_name = config_data['labels s3 bucket name']
         region = config_data['Region']
 
-        # Create a session using the provided IAM user credentials
-        session = boto3.Session(
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        # Create an S3 resource object using the above session
-        s3 = session.resource('s3')
+        # Reuse the shared S3 client for these credentials
+        s3 = aws_clients.get_client('s3', access_key, secret_key, region)
 
         # Check if the bucket exists
         try:
-            s3.meta.client.head_bucket(Bucket=bucket_name)
-        except ClientError:
+            s3.head_bucket(Bucket=bucket_name)
+        except botocore_exceptions.ClientError:
             result["message"] = f'Bucket {bucket_name} does not exist.'
             data.append(result)
             return False
 
+        # The Lambda writes the labels shortly after the upload; wait for them
+        labels_key = f"labels/{image_name}.json"
+
+        def labels_written():
+            try:
+                s3.head_object(Bucket=bucket_name, Key=labels_key)
+                return True
+            except botocore_exceptions.ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey'):
+                    raise
+                return False
+
         # Check if the labels for the image exist
         try:
-            labels_object = s3.Object(bucket_name, f"labels/{image_name}.json").get()
+            poll(labels_written, time.monotonic() if deadline is None else deadline)
+            labels_object = s3.get_object(Bucket=bucket_name, Key=f"labels/{image_name}.json")
             stored_labels = json.loads(labels_object['Body'].read().decode())['Labels']
-        except NoCredentialsError:
+        except botocore_exceptions.NoCredentialsError:
             result["message"] = "Credentials not available"
             data.append(result)
             return False
-        except ClientError:
+        except botocore_exceptions.ClientError:
             result["message"] = f"Labels for {image_name} do not exist in labels S3 bucket."
             data.append(result)
             return False
@@ -219,7 +223,7 @@ def check_label_bucket(data, image_name):
     return False
 
 
-def check_lambda_trigger(data, image):
+def check_lambda_trigger(data, config_data, image, since=None, deadline=None):
     result = {
         "testid": "Lambda Trigger Check",
         "status": "failure",
@@ -228,58 +232,62 @@ def check_lambda_trigger(data, image):
         "message": ""
     }
     try:
-        # Load the data.json file
-        with open('data.json') as f:
-            config_data = json.load(f)
-
-        # Set AWS credentials
-        os.environ['AWS_ACCESS_KEY_ID'] = config_data['INSTRUCTOR Access key ID']
-        os.environ['AWS_SECRET_ACCESS_KEY'] = config_data['INSTRUCTOR Secret Access Key']
-        os.environ['AWS_DEFAULT_REGION'] = config_data['Region']
-
         # Set log group name
         log_group_name = f'/aws/lambda/{config_data["Lambda Function Name"]}'
 
-        # Fetch the last 5 log streams
-        client = boto3.client('logs')
-        streams_response = client.describe_log_streams(
-            logGroupName=log_group_name,
-            orderBy='LastEventTime',
-            descending=True,
-            limit=5
+        client = aws_clients.get_client(
+            'logs',
+            config_data['INSTRUCTOR Access key ID'],
+            config_data['INSTRUCTOR Secret Access Key'],
+            config_data['Region']
         )
-
-        log_lines = []
-
-        # Fetch logs for each stream
-        for stream in streams_response['logStreams']:
-            stream_name = stream['logStreamName']
-            response = client.get_log_events(
+        processing_message = f'Processing image: {image} from bucket: {config_data["source s3 bucket name"]}'
+        generated_labels_message = f'Generated labels for image: {image}'
+        success_message = f'Successfully processed labels for image: {image} and stored in bucket: {config_data["labels s3 bucket name"]}'
+        search = log_fetch.LogSearch(log_fetch.LogMatcher(
+            [processing_message, generated_labels_message, success_message]
+        ))
+
+        # Only events that mention the image, logged since the upload, are
+        # transferred; the query is repeated until the Lambda's last message
+        # has been ingested or the deadline passes, and made once if it
+        # already has
+        start_time = int(((since or time.time()) - LOG_CLOCK_SKEW) * 1000)
+
+        def all_logged():
+            paginator = client.get_paginator('filter_log_events')
+            pages = paginator.paginate(
                 logGroupName=log_group_name,
-                logStreamName=stream_name
+                filterPattern=f'"{image}"',
+                startTime=start_time,
+                endTime=int(time.time() * 1000)
             )
-            
-            for event in response['events']:
-                log_lines.append(event['message'])
+            for page in pages:
+                for event in page['events']:
+                    search.add(event['message'])
+            return search.complete.is_set()
 
+        try:
+            poll(all_logged, time.monotonic() if deadline is None else deadline)
+        except botocore_exceptions.ClientError:
+            # Filtered search can be throttled; read the latest streams
+            # directly instead
+            log_fetch.search_streams(client, log_group_name, search, start_time=start_time)
 
         # Check if logs contain processing image message
-        processing_message = f'Processing image: {image} from bucket: {config_data["source s3 bucket name"]}'
-        if not any(processing_message in log_msg for log_msg in log_lines):
+        if not search.seen(0):
             result["message"] = f'Initial log not found for image: {image}'
             data.append(result)
             return
 
         # Check if logs contain generated labels message
-        generated_labels_message = f'Generated labels for image: {image}'
-        if not any(generated_labels_message in log_msg for log_msg in log_lines):
+        if not search.seen(1):
             result["message"]=f'Generated labels log not found for image: {image}'
             data.append(result)
             return
         
         # Check if logs contain successful processing message
-        success_message = f'Successfully processed labels for image: {image} and stored in bucket: {config_data["labels s3 bucket name"]}'
-        if not any(success_message in log_msg for log_msg in log_lines):
+        if not search.seen(2):
             result["message"]=f'Successful processing log not found for image: {image}'
             data.append(result)
             return
@@ -300,8 +308,7 @@ def check_lambda_trigger(data, image):
     data.append(result)
 
 
-def main():
-    overall = {"data": []}
+def grade(config_data):
     data = []
     default_bucket={
             "testid": "S3 Bucket Check",
@@ -325,13 +332,17 @@ def main():
                 "message": "Source Bucket check failed, skipping Lambda trigger check."
             }
     # Example usage
-    image_id = upload_image_and_get_id(data)
+    uploaded_at = time.time()
+    image_id = upload_image_and_get_id(data, config_data)
+    # One window for the Lambda, from the moment the image is in the bucket
+    deadline = time.monotonic() + LAMBDA_TIMEOUT
     if image_id:
-        flag = check_bucket(data, image_id)
+        flag = check_bucket(data, config_data, image_id)
         if flag:
-            check_label_bucket(data, image_id)
-            time.sleep(5)
-            check_lambda_trigger(data,image_id)
+            # The label check waits within the window; if it used it all up,
+            # the logs are queried once
+            check_label_bucket(data, config_data, image_id, deadline=deadline)
+            check_lambda_trigger(data, config_data, image_id, since=uploaded_at, deadline=deadline)
         else:
             data.append(default_label)
             data.append(default_lambda)
@@ -339,8 +350,27 @@ def main():
         data.append(default_bucket)
         data.append(default_label)
         data.append(default_lambda)
+    return data
+
+def evaluate(lab_directory='.'):
+    """
+    Grade the submission in lab_directory and return the evaluate.json payload.
+    """
+    overall = {"data": []}
+    try:
+        with open(os.path.join(lab_directory, 'data.json')) as f:
+            config_data = json.load(f)
+    except FileNotFoundError:
+        config_data = None
+    except Exception as e:
+        # Malformed data.json: the upload check fails with this error
+        config_data = e
 
-    overall['data'] = data
+    overall['data'] = grade(config_data)
+    return overall
+
+def main():
+    overall = evaluate()
     # Save the result to evaluate.json
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
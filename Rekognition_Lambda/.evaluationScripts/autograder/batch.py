@@ -0,0 +1,121 @@
+"""
+Grade a whole class roster in one process.
+
+Every line of the roster is a JSON object with the same keys as the lab's
+data.json (plus an optional "student_id"). Students are graded by a bounded
+pool of worker threads and one result record per student is streamed to the
+output file as soon as that student finishes:
+
+    python3 batch.py roster.jsonl results.jsonl --workers 16
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
+
+import autograder
+
+try:
+    import aws_clients
+except ImportError:
+    # Labs that make no AWS calls ship without the shared client pool
+    aws_clients = None
+
+try:
+    import ssh_pool
+except ImportError:
+    # Only labs that grade over SSH ship the connection pool
+    ssh_pool = None
+
+
+def read_roster(path):
+    """
+    Yield (line number, raw line) for every non-empty line of the roster.
+    """
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield line_no, line
+
+
+def grade_student(line_no, line, grade=None):
+    """
+    Grade one roster line and return its result record.
+    """
+    grade = grade or autograder.grade
+    record = {"line": line_no, "student": None, "data": []}
+    start_time = time.monotonic()
+    try:
+        payload = json.loads(line)
+        if isinstance(payload, dict):
+            record["student"] = payload.get("student_id")
+        record["data"] = grade(payload)
+    except Exception as e:
+        record["data"] = [{
+            "testid": "Script Execution",
+            "status": "failure",
+            "score": 0,
+            "maximum marks": 1,
+            "message": f"Script failed to execute: {e}"
+        }]
+    record["score"] = sum(test.get("score", 0) for test in record["data"])
+    record["maximum marks"] = sum(test.get("maximum marks", 0) for test in record["data"])
+    record["seconds"] = round(time.monotonic() - start_time, 3)
+    return record
+
+
+def run_batch(roster_path, output_path, workers=8, grade=None):
+    """
+    Grade every student in the roster and stream the records to output_path.
+    Returns the number of students graded.
+    """
+    count = 0
+    # At most 2 * workers students are in flight, so the roster is never
+    # loaded into memory in full
+    max_pending = 2 * workers
+    with open(output_path, 'w') as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def drain(return_when):
+            nonlocal pending, count
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                out.write(json.dumps(future.result()) + "\n")
+                count += 1
+            out.flush()
+
+        for line_no, line in read_roster(roster_path):
+            if len(pending) >= max_pending:
+                drain(FIRST_COMPLETED)
+            pending.add(pool.submit(grade_student, line_no, line, grade))
+        if pending:
+            drain(ALL_COMPLETED)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a roster of students in one process.")
+    parser.add_argument("roster", help="JSONL file with one data.json payload per line")
+    parser.add_argument("output", help="JSONL file to stream one result record per student to")
+    parser.add_argument("--workers", type=int, default=8, help="number of students graded concurrently")
+    parser.add_argument("--client-pool-size", type=int, default=None,
+                        help="maximum number of cached AWS clients (default: $GRADER_CLIENT_POOL_SIZE or 64)")
+    args = parser.parse_args(argv)
+
+    if aws_clients is not None:
+        # Every worker may hold a connection on a shared client at once
+        aws_clients.configure(max_size=args.client_pool_size, max_pool_connections=max(args.workers, aws_clients.MAX_POOL_CONNECTIONS))
+    if ssh_pool is not None:
+        # Room for one connection per worker; the handshake cap and the
+        # timeouts keep unreachable VMs from stalling the other workers
+        ssh_pool.configure(max_size=max(args.workers, ssh_pool.POOL_SIZE))
+
+    start_time = time.monotonic()
+    count = run_batch(args.roster, args.output, workers=args.workers)
+    elapsed = time.monotonic() - start_time
+    print(f"Graded {count} students in {elapsed:.1f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,722 @@
+"""
+In-memory stand-in for the AWS APIs the graders use.
+
+LocalAWS holds a world of accounts keyed by access key. Each account has EC2
+networking, IAM users and policies, S3 buckets and CloudWatch log groups. Its
+clients implement the subset of the boto3 client interface that the graders
+call, including paginators and ClientError codes, so a grader cannot tell it
+apart from AWS. Install it with
+
+    LocalAWS.from_file('fixtures.json').install()
+
+or set GRADER_LOCAL_FIXTURES=fixtures.json before running any grader entry
+point, which calls load(). Synthetic worlds for load tests can be generated
+from the command line:
+
+    python3 local_backend.py generate --lab vpc --students 2000 \\
+        --fixtures fixtures.json --roster roster.jsonl
+
+The S3 labs also need the student's web application; LocalStudentApp serves
+it for every student of a fixture file on one port, telling students apart by
+the loopback address (127.x.y.z) they were assigned. load() starts it in the
+grading process when the fixture file has an "apps" section, so uploads land
+in the same world the grader reads back.
+"""
+import argparse
+import base64
+import copy
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from botocore.exceptions import ClientError
+
+import aws_clients
+import loopback
+
+# Items per page returned by paginators, small enough to exercise paging
+PAGE_SIZE = 50
+
+
+def client_error(operation, code, message=''):
+    return ClientError({'Error': {'Code': code, 'Message': message or code}}, operation)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class LocalPaginator:
+    def __init__(self, client, operation, result_key):
+        self.client = client
+        self.operation = operation
+        self.result_key = result_key
+
+    def paginate(self, **kwargs):
+        response = getattr(self.client, self.operation)(**kwargs)
+        items = response.get(self.result_key, [])
+        for start in range(0, max(len(items), 1), PAGE_SIZE):
+            page = dict(response)
+            page[self.result_key] = items[start:start + PAGE_SIZE]
+            yield page
+
+
+class LocalClient:
+    """
+    Base class: checks credentials, records every call and serves paginators.
+    """
+    service = None
+    paginators = {}
+
+    def __init__(self, world, access_key, secret_key, region):
+        self.world = world
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+
+    def account(self, operation, size=0):
+        self.world.record_call(self.service, operation, size)
+        account = self.world.accounts.get(self.access_key)
+        if account is None:
+            raise client_error(operation, 'InvalidClientTokenId', 'The security token included in the request is invalid.')
+        if account.get('secret') not in (None, self.secret_key):
+            raise client_error(operation, 'SignatureDoesNotMatch')
+        return account
+
+    def can_paginate(self, operation):
+        return operation in self.paginators
+
+    def get_paginator(self, operation):
+        if operation not in self.paginators:
+            raise NotImplementedError(f"{self.service} has no local paginator for {operation}")
+        return LocalPaginator(self, operation, self.paginators[operation])
+
+
+def tag_value(resource, key):
+    for tag in resource.get('Tags', []):
+        if tag['Key'] == key:
+            return tag['Value']
+    return None
+
+
+def ec2_filter_values(resource, name):
+    """
+    Values of an EC2 describe filter for one resource.
+    """
+    if name.startswith('tag:'):
+        value = tag_value(resource, name[4:])
+        return [] if value is None else [value]
+    if name == 'vpc-id':
+        return [resource.get('VpcId')]
+    if name == 'association.subnet-id':
+        return [a['SubnetId'] for a in resource.get('Associations', []) if 'SubnetId' in a]
+    if name == 'association.main':
+        return ['true' if any(a.get('Main') for a in resource.get('Associations', [])) else 'false']
+    if name == 'attachment.vpc-id':
+        return [a['VpcId'] for a in resource.get('Attachments', [])]
+    raise NotImplementedError(f"EC2 filter {name} is not supported locally")
+
+
+def ec2_filter(resources, filters, id_key=None, ids=None):
+    selected = []
+    for resource in resources:
+        if ids and resource.get(id_key) not in ids:
+            continue
+        if all(set(ec2_filter_values(resource, f['Name'])) & set(f['Values']) for f in filters or []):
+            selected.append(copy.deepcopy(resource))
+    return selected
+
+
+class LocalEC2(LocalClient):
+    service = 'ec2'
+    paginators = {
+        'describe_vpcs': 'Vpcs',
+        'describe_internet_gateways': 'InternetGateways',
+        'describe_subnets': 'Subnets',
+        'describe_route_tables': 'RouteTables',
+    }
+
+    def _describe(self, operation, collection, result_key, id_key, Filters=None, ids=None):
+        ec2 = self.account(operation).get('ec2', {})
+        return {result_key: ec2_filter(ec2.get(collection, []), Filters, id_key, ids)}
+
+    def describe_vpcs(self, Filters=None, VpcIds=None, **kwargs):
+        return self._describe('DescribeVpcs', 'vpcs', 'Vpcs', 'VpcId', Filters, VpcIds)
+
+    def describe_internet_gateways(self, Filters=None, InternetGatewayIds=None, **kwargs):
+        return self._describe('DescribeInternetGateways', 'internet_gateways', 'InternetGateways',
+                              'InternetGatewayId', Filters, InternetGatewayIds)
+
+    def describe_subnets(self, Filters=None, SubnetIds=None, **kwargs):
+        return self._describe('DescribeSubnets', 'subnets', 'Subnets', 'SubnetId', Filters, SubnetIds)
+
+    def describe_route_tables(self, Filters=None, RouteTableIds=None, **kwargs):
+        return self._describe('DescribeRouteTables', 'route_tables', 'RouteTables', 'RouteTableId',
+                              Filters, RouteTableIds)
+
+
+class LocalIAM(LocalClient):
+    service = 'iam'
+    paginators = {
+        'list_attached_user_policies': 'AttachedPolicies',
+        'list_user_policies': 'PolicyNames',
+        'list_groups_for_user': 'Groups',
+        'simulate_principal_policy': 'EvaluationResults',
+    }
+
+    def _user(self, operation, user_name):
+        users = self.account(operation).get('iam', {}).get('users', {})
+        if user_name not in users:
+            raise client_error(operation, 'NoSuchEntity', f"The user with name {user_name} cannot be found.")
+        return users[user_name]
+
+    def get_access_key_last_used(self, AccessKeyId):
+        users = self.account('GetAccessKeyLastUsed').get('iam', {}).get('users', {})
+        for user_name, user in users.items():
+            if AccessKeyId in user.get('access_keys', []):
+                return {'UserName': user_name, 'AccessKeyLastUsed': {}}
+        raise client_error('GetAccessKeyLastUsed', 'AccessDenied')
+
+    def _policy(self, operation, policy_arn):
+        policies = self.account(operation).get('iam', {}).get('policies', {})
+        if policy_arn not in policies:
+            raise client_error(operation, 'NoSuchEntity', f"Policy {policy_arn} does not exist or is not attachable.")
+        return policies[policy_arn]
+
+    def get_user(self, UserName):
+        user = self._user('GetUser', UserName)
+        found = {'UserName': UserName, 'Arn': user['arn']}
+        if user.get('permissions_boundary'):
+            found['PermissionsBoundary'] = {'PermissionsBoundaryType': 'Policy',
+                                            'PermissionsBoundaryArn': user['permissions_boundary']}
+        return {'User': found}
+
+    def get_policy(self, PolicyArn):
+        policy = self._policy('GetPolicy', PolicyArn)
+        return {'Policy': {'PolicyName': policy.get('name', PolicyArn.rsplit('/', 1)[-1]), 'Arn': PolicyArn,
+                           'DefaultVersionId': policy.get('default_version', 'v1')}}
+
+    def get_policy_version(self, PolicyArn, VersionId):
+        policy = self._policy('GetPolicyVersion', PolicyArn)
+        if VersionId != policy.get('default_version', 'v1'):
+            raise client_error('GetPolicyVersion', 'NoSuchEntity')
+        # Decoded, as boto3 returns it
+        return {'PolicyVersion': {'Document': policy.get('document', {}), 'VersionId': VersionId,
+                                  'IsDefaultVersion': True}}
+
+    def list_user_policies(self, UserName, **kwargs):
+        user = self._user('ListUserPolicies', UserName)
+        return {'PolicyNames': list(user.get('inline_policies', {}))}
+
+    def list_groups_for_user(self, UserName, **kwargs):
+        user = self._user('ListGroupsForUser', UserName)
+        return {'Groups': [{'GroupName': name} for name in user.get('groups', [])]}
+
+    def list_attached_user_policies(self, UserName, **kwargs):
+        user = self._user('ListAttachedUserPolicies', UserName)
+        policies = self.world.accounts[self.access_key].get('iam', {}).get('policies', {})
+        return {'AttachedPolicies': [
+            {'PolicyArn': arn, 'PolicyName': policies.get(arn, {}).get('name', arn.rsplit('/', 1)[-1])}
+            for arn in user.get('attached_policies', [])
+        ]}
+
+    def simulate_principal_policy(self, PolicySourceArn, ActionNames, **kwargs):
+        # Only the IAM grader simulates policies, and only it ships policy_eval
+        import policy_eval
+
+        account = self.account('SimulatePrincipalPolicy')
+        iam = account.get('iam', {})
+        user = next((u for u in iam.get('users', {}).values() if u['arn'] == PolicySourceArn), None)
+        if user is None:
+            raise client_error('SimulatePrincipalPolicy', 'NoSuchEntity')
+        # Every identity policy counts: attached, inline and those of groups
+        holders = [user] + [iam.get('groups', {}).get(name, {}) for name in user.get('groups', [])]
+        documents = []
+        for holder in holders:
+            documents.extend(iam.get('policies', {}).get(arn, {}).get('document', {})
+                             for arn in holder.get('attached_policies', []))
+            documents.extend(holder.get('inline_policies', {}).values())
+        statements = []
+        for document in documents:
+            found = policy_eval.load_policy(document).get('Statement', [])
+            statements.extend([found] if isinstance(found, dict) else found)
+        policy = policy_eval.compile_policy({'Version': '2012-10-17', 'Statement': statements})
+        results = []
+        for action in ActionNames:
+            # The simulator has the full context, so anything the local
+            # engine cannot decide is treated as not allowed
+            decision = policy.evaluate(action) or policy_eval.IMPLICIT_DENY
+            results.append({'EvalActionName': action, 'EvalResourceName': '*', 'EvalDecision': decision})
+        return {'EvaluationResults': results, 'IsTruncated': False}
+
+
+class LocalBody:
+    def __init__(self, content):
+        self.content = content
+        self.offset = 0
+
+    def read(self, amt=None):
+        end = len(self.content) if amt is None else self.offset + amt
+        chunk = self.content[self.offset:end]
+        self.offset += len(chunk)
+        return chunk
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        pass
+
+
+class LocalS3(LocalClient):
+    service = 's3'
+
+    def _bucket(self, operation, bucket, size=0):
+        buckets = self.account(operation, size).setdefault('s3', {})
+        if bucket not in buckets:
+            raise client_error(operation, 'NoSuchBucket' if operation != 'HeadBucket' else '404')
+        return buckets[bucket]
+
+    def _object(self, operation, bucket, key, size=0):
+        objects = self._bucket(operation, bucket, size)
+        if key not in objects:
+            raise client_error(operation, 'NoSuchKey' if operation == 'GetObject' else '404')
+        return objects[key]
+
+    def head_bucket(self, Bucket):
+        self._bucket('HeadBucket', Bucket)
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        obj = self._object('HeadObject', Bucket, Key)
+        return {'ContentLength': len(obj['body']), 'ETag': obj['etag'], 'LastModified': obj['last_modified']}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        # Size looked up ahead so the call is recorded once, with its body
+        found = self.world.accounts.get(self.access_key, {}).get('s3', {}).get(Bucket, {}).get(Key)
+        obj = self._object('GetObject', Bucket, Key, len(found['body']) if found else 0)
+        if IfNoneMatch is not None and IfNoneMatch == obj['etag']:
+            raise client_error('GetObject', '304', 'Not Modified')
+        return {'Body': LocalBody(obj['body']), 'ContentLength': len(obj['body']),
+                'ETag': obj['etag'], 'LastModified': obj['last_modified']}
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        Fileobj.write(self.get_object(Bucket=Bucket, Key=Key)['Body'].read())
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        with open(Filename, 'wb') as f:
+            self.download_fileobj(Bucket, Key, f)
+
+    def put_object(self, Bucket, Key, Body=b'', **kwargs):
+        if isinstance(Body, str):
+            Body = Body.encode()
+        elif hasattr(Body, 'read'):
+            Body = Body.read()
+        objects = self._bucket('PutObject', Bucket)
+        etag = '"' + hashlib.md5(Body).hexdigest() + '"'
+        objects[Key] = {'body': bytes(Body), 'etag': etag, 'last_modified': time.time()}
+        return {'ETag': etag}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, **kwargs):
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj)
+
+
+class LocalLogs(LocalClient):
+    service = 'logs'
+    paginators = {
+        'describe_log_streams': 'logStreams',
+        'filter_log_events': 'events',
+    }
+
+    def _group(self, operation, group):
+        groups = self.account(operation).setdefault('logs', {})
+        if group not in groups:
+            raise client_error(operation, 'ResourceNotFoundException', 'The specified log group does not exist.')
+        return groups[group]
+
+    def describe_log_streams(self, logGroupName, orderBy='LogStreamName', descending=False, limit=50, **kwargs):
+        streams = []
+        for name, events in self._group('DescribeLogStreams', logGroupName).items():
+            stream = {'logStreamName': name}
+            if events:
+                stream['lastEventTimestamp'] = events[-1]['timestamp']
+            streams.append(stream)
+        if orderBy == 'LastEventTime':
+            streams.sort(key=lambda s: s.get('lastEventTimestamp', 0), reverse=descending)
+        else:
+            streams.sort(key=lambda s: s['logStreamName'], reverse=descending)
+        return {'logStreams': streams[:limit]}
+
+    def get_log_events(self, logGroupName, logStreamName, startTime=None, endTime=None,
+                       nextToken=None, limit=100, startFromHead=False, **kwargs):
+        group = self._group('GetLogEvents', logGroupName)
+        if logStreamName not in group:
+            raise client_error('GetLogEvents', 'ResourceNotFoundException', 'The specified log stream does not exist.')
+        events = [e for e in group[logStreamName]
+                  if (startTime is None or e['timestamp'] >= startTime)
+                  and (endTime is None or e['timestamp'] < endTime)]
+        if nextToken:
+            start = int(nextToken[2:])
+        elif startFromHead:
+            start = 0
+        else:
+            start = max(len(events) - limit, 0)
+        page = events[start:start + limit]
+        end = start + len(page)
+        return {'events': copy.deepcopy(page), 'nextForwardToken': f"f/{end}", 'nextBackwardToken': f"b/{start}"}
+
+    def filter_log_events(self, logGroupName, filterPattern=None, startTime=None, endTime=None,
+                          logStreamNames=None, **kwargs):
+        group = self._group('FilterLogEvents', logGroupName)
+        terms = re.findall(r'"([^"]*)"|(\S+)', filterPattern or '')
+        terms = [quoted or bare for quoted, bare in terms]
+        events = []
+        for name, stream_events in group.items():
+            if logStreamNames and name not in logStreamNames:
+                continue
+            for event in stream_events:
+                if startTime is not None and event['timestamp'] < startTime:
+                    continue
+                if endTime is not None and event['timestamp'] > endTime:
+                    continue
+                if all(term in event['message'] for term in terms):
+                    events.append(dict(event, logStreamName=name))
+        events.sort(key=lambda e: e['timestamp'])
+        return {'events': events, 'searchedLogStreams': []}
+
+    def put_log_events(self, logGroupName, logStreamName, logEvents, **kwargs):
+        groups = self.account('PutLogEvents').setdefault('logs', {})
+        stream = groups.setdefault(logGroupName, {}).setdefault(logStreamName, [])
+        for event in logEvents:
+            stream.append({'timestamp': event['timestamp'], 'message': event['message'], 'ingestionTime': now_ms()})
+        return {}
+
+
+SERVICES = {'ec2': LocalEC2, 'iam': LocalIAM, 's3': LocalS3, 'logs': LocalLogs}
+
+
+class LocalAWS:
+    """
+    A world of accounts; client() has the same signature as
+    aws_clients.get_client so it can be installed as the backend.
+    """
+
+    def __init__(self, accounts=None, apps=None):
+        self.accounts = accounts or {}
+        # LocalStudentApp settings (flavor, port, lambda_delay), if any
+        self.apps = apps
+        # API calls served, by (service, operation)
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def record_call(self, service, operation, size=0):
+        # Only object bodies count towards the bytes transferred
+        with self._calls_lock:
+            self.calls[(service, operation)] += 1
+        aws_clients.record_call(service, operation, size)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            fixtures = json.load(f)
+        accounts = fixtures.get('accounts', {})
+        for account in accounts.values():
+            # Object bodies are stored base64-encoded in fixture files
+            for bucket in account.get('s3', {}).values():
+                for key, obj in list(bucket.items()):
+                    body = base64.b64decode(obj) if isinstance(obj, str) else base64.b64decode(obj['body'])
+                    bucket[key] = {'body': body, 'etag': '"' + hashlib.md5(body).hexdigest() + '"',
+                                   'last_modified': time.time()}
+        return cls(accounts, fixtures.get('apps'))
+
+    def to_file(self, path):
+        accounts = copy.deepcopy(self.accounts)
+        for account in accounts.values():
+            for bucket in account.get('s3', {}).values():
+                for key, obj in list(bucket.items()):
+                    bucket[key] = base64.b64encode(obj['body']).decode()
+        fixtures = {'accounts': accounts}
+        if self.apps:
+            fixtures['apps'] = self.apps
+        with open(path, 'w') as f:
+            json.dump(fixtures, f)
+
+    def client(self, service, access_key, secret_key, region):
+        return SERVICES[service](self, access_key, secret_key, region)
+
+    def install(self):
+        aws_clients.set_backend(self.client)
+        return self
+
+    def add_account(self, access_key, secret_key):
+        return self.accounts.setdefault(access_key, {'secret': secret_key})
+
+
+class LocalStudentApp:
+    """
+    The students' photo-upload web applications for the S3 labs.
+
+    Every student in the world whose account has an 'app' entry is served
+    from one threaded HTTP server; the loopback address a request arrives on
+    selects the student. flavor is 'cloud9' (flash message with the image id)
+    or 'rekognition' (redirect carrying image_id, plus a simulated Lambda that
+    writes labels and log events after lambda_delay seconds).
+    """
+
+    def __init__(self, world, port=0, flavor='cloud9', lambda_delay=0.0):
+        self.world = world
+        self.flavor = flavor
+        self.lambda_delay = lambda_delay
+        self.apps = {}
+        for access_key, account in world.accounts.items():
+            if 'app' in account:
+                self.apps[account['app']['address']] = (access_key, account)
+        app = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = b'<html><body><form method="post" enctype="multipart/form-data"></form></body></html>'
+                self._reply(200, body)
+
+            def do_POST(self):
+                student = app.apps.get(self.connection.getsockname()[0])
+                length = int(self.headers.get('Content-Length', 0))
+                payload = self.rfile.read(length)
+                if student is None:
+                    return self._reply(404, b'unknown student')
+                image = extract_multipart_file(payload)
+                app.store_upload(student, image, self)
+
+            def _reply(self, status, body, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def store_upload(self, student, image, handler):
+        access_key, account = student
+        app = account['app']
+        key = 'pic_' + str(uuid.uuid4()) + '.jpg'
+        s3 = self.world.client('s3', access_key, account.get('secret'), app.get('region'))
+        s3.put_object(Bucket=app['bucket'], Key=key, Body=image)
+        if self.flavor == 'rekognition':
+            handler._reply(302, b'', [('Location', f'/?image_id={key}')])
+            worker = threading.Timer(self.lambda_delay, self.run_lambda, (access_key, account, key))
+            worker.daemon = True
+            worker.start()
+        else:
+            message = f'File uploaded successfully.Image ID: {key}'
+            body = f'<html><body><div class="alert alert-success">\n{message}\n</div></body></html>'
+            handler._reply(200, body.encode())
+
+    def run_lambda(self, access_key, account, key):
+        app = account['app']
+        logs = self.world.client('logs', access_key, account.get('secret'), app.get('region'))
+        s3 = self.world.client('s3', access_key, account.get('secret'), app.get('region'))
+        group = f"/aws/lambda/{app['function']}"
+        stream = time.strftime('%Y/%m/%d/[$LATEST]') + uuid.uuid4().hex
+        labels = ['Animal', 'Pet', 'Dog']
+        messages = [
+            f"Processing image: {key} from bucket: {app['bucket']}",
+            f"Generated labels for image: {key} are {labels}",
+        ]
+        try:
+            s3.put_object(Bucket=app['labels_bucket'], Key=f'labels/{key}.json',
+                          Body=json.dumps({'Image': key, 'Labels': labels}))
+            messages.append(f"Successfully processed labels for image: {key} and stored in bucket: {app['labels_bucket']}")
+        except ClientError as e:
+            messages.append(f"Error processing image {key}: {e}")
+        logs.put_log_events(logGroupName=group, logStreamName=stream,
+                            logEvents=[{'timestamp': now_ms(), 'message': m} for m in messages])
+
+
+def load(path):
+    """
+    Read a fixture file, install it as the aws_clients backend and start the
+    student apps it describes.
+    """
+    world = LocalAWS.from_file(path).install()
+    if world.apps:
+        LocalStudentApp(world, **world.apps).start()
+    return world
+
+
+def extract_multipart_file(payload):
+    """
+    Return the bytes of the first file part of a multipart/form-data body.
+    """
+    header_end = payload.find(b'\r\n\r\n')
+    if header_end == -1:
+        return b''
+    boundary = payload[:payload.find(b'\r\n')]
+    body = payload[header_end + 4:]
+    end = body.find(b'\r\n' + boundary)
+    return body if end == -1 else body[:end]
+
+
+def synthetic_vpc_student(world, index, rng, broken_rate):
+    access_key = f"AKIALOCALVPC{index:08d}"
+    account = world.add_account(access_key, 'local-secret')
+    vpc_id, igw_id = f"vpc-{index:08x}", f"igw-{index:08x}"
+    public_rt, main_rt = f"rtb-p{index:07x}", f"rtb-m{index:07x}"
+
+    def name(value):
+        return [{'Key': 'Name', 'Value': value}]
+
+    broken = rng.random() < broken_rate
+    subnets = [
+        ('subnet-public-a', '10.1.1.0/24', 'us-west-2a', True),
+        ('subnet-public-b', '10.1.2.0/24', 'us-west-2b', True),
+        ('subnet-private-a', '10.1.3.0/24', 'us-west-2a', False),
+        ('subnet-private-b', '10.1.4.0/24', 'us-west-2b', False),
+    ]
+    account['ec2'] = {
+        'vpcs': [{'VpcId': vpc_id, 'CidrBlock': '10.1.0.0/16', 'Tags': name('aws-vpc')}],
+        'internet_gateways': [] if broken and rng.random() < 0.5 else [
+            {'InternetGatewayId': igw_id, 'Attachments': [{'VpcId': vpc_id, 'State': 'available'}], 'Tags': name('aws-igw')}
+        ],
+        'subnets': [
+            {'SubnetId': f"subnet-{index:06x}{i}", 'VpcId': vpc_id, 'CidrBlock': cidr, 'AvailabilityZone': az,
+             'MapPublicIpOnLaunch': public and not (broken and i == 1), 'Tags': name(subnet_name)}
+            for i, (subnet_name, cidr, az, public) in enumerate(subnets)
+        ],
+        'route_tables': [
+            {'RouteTableId': public_rt, 'VpcId': vpc_id, 'Tags': name('routetable-public'),
+             'Routes': [{'DestinationCidrBlock': '10.1.0.0/16', 'GatewayId': 'local'},
+                        {'DestinationCidrBlock': '0.0.0.0/0', 'GatewayId': igw_id}],
+             'Associations': [{'SubnetId': f"subnet-{index:06x}{i}", 'Main': False} for i in (0, 1)]},
+            {'RouteTableId': main_rt, 'VpcId': vpc_id,
+             'Routes': [{'DestinationCidrBlock': '10.1.0.0/16', 'GatewayId': 'local'}],
+             'Associations': [{'Main': True}]},
+        ],
+    }
+    return {'ACCESS_KEY_ID': access_key, 'SECRET_ACCESS_KEY': 'local-secret', 'region': 'us-west-2'}
+
+
+def synthetic_iam_student(world, index, rng, broken_rate):
+    from autograder import TEST_CASES
+
+    access_key = f"AKIALOCALIAM{index:08d}"
+    account = world.add_account(access_key, 'local-secret')
+    policy_arn = f"arn:aws:iam::{index:012d}:policy/lab-policy"
+    statements = []
+    for tc in TEST_CASES:
+        allowed, denied = list(tc['allowed']), list(tc['denied'])
+        if rng.random() < broken_rate:
+            # The classic mistake: a denied action ends up allowed
+            allowed.append(denied.pop())
+        statements.append({'Effect': 'Allow', 'Action': allowed, 'Resource': '*'})
+        if denied:
+            statements.append({'Effect': 'Deny', 'Action': denied, 'Resource': '*'})
+    statements.append({'Effect': 'Allow', 'Action': 'iam:*', 'Resource': '*'})
+    account['iam'] = {
+        'users': {'instructor': {'arn': f"arn:aws:iam::{index:012d}:user/instructor",
+                                 'access_keys': [access_key], 'attached_policies': [policy_arn]}},
+        'policies': {policy_arn: {'name': 'lab-policy',
+                                  'document': {'Version': '2012-10-17', 'Statement': statements}}},
+    }
+    return {'ACCESS_KEY_ID': access_key, 'SECRET_ACCESS_KEY': 'local-secret',
+            'region': 'us-east-1', 'policy-arn': policy_arn}
+
+
+def synthetic_upload_student(world, index, rng, broken_rate, app_port, rekognition):
+    access_key = f"AKIALOCAL{'REK' if rekognition else 'S3X'}{index:08d}"
+    account = world.add_account(access_key, 'local-secret')
+    bucket, labels_bucket = f"photos-{index}", f"labels-{index}"
+    account['s3'] = {bucket: {}}
+    if rekognition:
+        account['s3'][labels_bucket] = {}
+        account['logs'] = {f"/aws/lambda/labeler-{index}": {}}
+    address = loopback.loopback_address(index)
+    account['app'] = {'address': address, 'region': 'us-west-2', 'bucket': bucket,
+                      'labels_bucket': labels_bucket, 'function': f"labeler-{index}"}
+    payload = {'public_ip': address, 'port': str(app_port),
+               'INSTRUCTOR Access key ID': access_key, 'INSTRUCTOR Secret Access Key': 'local-secret',
+               'Region': 'us-west-2'}
+    if rekognition:
+        payload.update({'source s3 bucket name': bucket, 'labels s3 bucket name': labels_bucket,
+                        'Lambda Function Name': f"labeler-{index}"})
+    else:
+        payload['s3 bucket name'] = bucket
+    if rng.random() < broken_rate:
+        payload['labels s3 bucket name' if rekognition else 's3 bucket name'] = 'missing-bucket'
+    return payload
+
+
+def generate(lab, students, seed=0, broken_rate=0.1, app_port=8080, lambda_delay=0.0):
+    """
+    Build a synthetic world and roster for one lab.
+    """
+    world = LocalAWS()
+    if lab in ('cloud9', 'rekognition'):
+        world.apps = {'port': app_port, 'flavor': lab, 'lambda_delay': lambda_delay}
+    rng = random.Random(seed)
+    roster = []
+    for index in range(students):
+        if lab == 'vpc':
+            payload = synthetic_vpc_student(world, index, rng, broken_rate)
+        elif lab == 'iam':
+            payload = synthetic_iam_student(world, index, rng, broken_rate)
+        elif lab in ('cloud9', 'rekognition'):
+            payload = synthetic_upload_student(world, index, rng, broken_rate, app_port, lab == 'rekognition')
+        else:
+            raise ValueError(f"Unknown lab {lab}")
+        payload['student_id'] = f"student-{index:05d}"
+        roster.append(payload)
+    return world, roster
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local AWS stand-in for the graders.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen = commands.add_parser('generate', help="write a synthetic fixture file and roster")
+    gen.add_argument('--lab', required=True, choices=['vpc', 'iam', 'cloud9', 'rekognition'])
+    gen.add_argument('--students', type=int, default=100)
+    gen.add_argument('--seed', type=int, default=0)
+    gen.add_argument('--broken-rate', type=float, default=0.1, help="fraction of students with a mistake")
+    gen.add_argument('--app-port', type=int, default=8080, help="port LocalStudentApp will serve on")
+    gen.add_argument('--lambda-delay', type=float, default=0.0, help="seconds before the simulated Lambda runs")
+    gen.add_argument('--fixtures', required=True)
+    gen.add_argument('--roster', required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        world, roster = generate(args.lab, args.students, args.seed, args.broken_rate,
+                                 args.app_port, args.lambda_delay)
+        world.to_file(args.fixtures)
+        with open(args.roster, 'w') as f:
+            for payload in roster:
+                f.write(json.dumps(payload) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Search a Lambda's CloudWatch log streams for a set of expected messages.
+
+The most recent streams are read concurrently, one thread per stream, each
+following nextForwardToken through every page. All threads stop as soon as
+every expected message has been seen. Messages are matched with a single
+precompiled pattern, so each log event is scanned once for all of them.
+"""
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Streams searched, most recently written first
+STREAM_LIMIT = 5
+# Upper bound on pages read from one stream
+MAX_PAGES = 100
+
+
+class LogMatcher:
+    """
+    Finds which of several literal messages occur in log text.
+    """
+
+    def __init__(self, messages):
+        self.messages = list(messages)
+        self.pattern = re.compile('|'.join(
+            f'(?P<m{i}>{re.escape(message)})' for i, message in enumerate(self.messages)
+        ))
+
+    def scan(self, text):
+        """
+        Return the indices of the messages that occur in text.
+        """
+        return {int(match.lastgroup[1:]) for match in self.pattern.finditer(text)}
+
+
+class LogSearch:
+    """
+    Accumulates which expected messages have been seen, across threads.
+    """
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.found = set()
+        self.complete = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        matched = self.matcher.scan(text)
+        if not matched:
+            return
+        with self._lock:
+            self.found |= matched
+            if len(self.found) == len(self.matcher.messages):
+                self.complete.set()
+
+    def seen(self, index):
+        with self._lock:
+            return index in self.found
+
+
+def search_stream(client, log_group_name, stream_name, search, start_time=None):
+    kwargs = {'logGroupName': log_group_name, 'logStreamName': stream_name, 'startFromHead': True}
+    if start_time is not None:
+        kwargs['startTime'] = start_time
+    for _ in range(MAX_PAGES):
+        if search.complete.is_set():
+            return
+        response = client.get_log_events(**kwargs)
+        for event in response['events']:
+            search.add(event['message'])
+        token = response.get('nextForwardToken')
+        # The forward token repeats once the end of the stream is reached;
+        # an empty page before that is only a gap in the stream
+        if token is None or token == kwargs.get('nextToken'):
+            return
+        kwargs['nextToken'] = token
+
+
+def search_streams(client, log_group_name, search, start_time=None, stream_limit=STREAM_LIMIT):
+    """
+    Scan the latest streams of a log group concurrently until every expected
+    message has been seen or the streams are exhausted.
+    """
+    streams = client.describe_log_streams(
+        logGroupName=log_group_name,
+        orderBy='LastEventTime',
+        descending=True,
+        limit=stream_limit
+    )['logStreams']
+    if not streams:
+        return search
+    with ThreadPoolExecutor(max_workers=len(streams)) as pool:
+        futures = [
+            pool.submit(search_stream, client, log_group_name, stream['logStreamName'], search, start_time)
+            for stream in streams
+        ]
+        for future in futures:
+            future.result()
+    return search
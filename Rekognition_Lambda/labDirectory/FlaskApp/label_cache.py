@@ -0,0 +1,114 @@
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+import json
+import threading
+import time
+
+# Labels are cached per image; the least recently used ones go first
+MAX_ENTRIES = 1024
+# Seconds a cached result is served before S3 is asked whether it changed
+FRESH_FOR = 30.0
+# Seconds a missing labels object is remembered; short, since the Lambda
+# usually writes it moments after the upload
+NEGATIVE_TTL = 2.0
+
+NOT_FOUND_CODES = ('NoSuchKey', '404')
+NOT_MODIFIED_CODES = ('304', 'NotModified')
+
+
+class CacheEntry:
+    def __init__(self, data, etag, expires):
+        # None for an image whose labels do not exist (yet)
+        self.data = data
+        self.etag = etag
+        self.expires = expires
+
+
+class LabelCache:
+    """
+    Bounded LRU cache of the label documents in the labels bucket.
+
+    A cached document is served as is for FRESH_FOR seconds. After that, it
+    is revalidated with a conditional GET (If-None-Match on its ETag). S3
+    answers 304 without a body when it has not changed. Missing documents
+    are cached for NEGATIVE_TTL seconds. Any other S3 error is raised and
+    not cached.
+    """
+
+    def __init__(self, s3, bucket, max_entries=MAX_ENTRIES, fresh_for=FRESH_FOR, negative_ttl=NEGATIVE_TTL):
+        self.s3 = s3
+        self.bucket = bucket
+        self.max_entries = max_entries
+        self.fresh_for = fresh_for
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ('hits', 'negative_hits', 'misses', 'revalidated', 'refreshed', 'not_found', 'errors', 'evictions'), 0)
+
+    @staticmethod
+    def key(image_name):
+        return f'labels/{image_name}.json'
+
+    def get(self, image_name):
+        """
+        The label document for image_name, or None if there is none.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(image_name)
+            if entry is not None:
+                self._entries.move_to_end(image_name)
+                if now < entry.expires:
+                    self._counts['hits' if entry.data is not None else 'negative_hits'] += 1
+                    return entry.data
+            # Only a stale positive entry can be revalidated
+            etag = entry.etag if entry is not None and entry.data is not None else None
+
+        request = {'Bucket': self.bucket, 'Key': self.key(image_name)}
+        if etag is not None:
+            request['IfNoneMatch'] = etag
+        try:
+            response = self.s3.get_object(**request)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if etag is not None and code in NOT_MODIFIED_CODES:
+                self._count('revalidated')
+                return self._store(image_name, entry.data, etag, self.fresh_for)
+            if code in NOT_FOUND_CODES:
+                self._count('not_found')
+                return self._store(image_name, None, None, self.negative_ttl)
+            self._count('errors')
+            raise
+        except Exception:
+            self._count('errors')
+            raise
+
+        data = json.loads(response['Body'].read())
+        self._count('refreshed' if etag is not None else 'misses')
+        return self._store(image_name, data, response.get('ETag'), self.fresh_for)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['entries'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        lookups = stats['hits'] + stats['negative_hits'] + stats['misses'] + stats['revalidated'] \
+            + stats['refreshed'] + stats['not_found'] + stats['errors']
+        # Lookups answered without downloading a document
+        saved = stats['hits'] + stats['negative_hits'] + stats['revalidated']
+        stats['hit_ratio'] = round(saved / lookups, 4) if lookups else None
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _store(self, image_name, data, etag, ttl):
+        with self._lock:
+            self._entries[image_name] = CacheEntry(data, etag, time.monotonic() + ttl)
+            self._entries.move_to_end(image_name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counts['evictions'] += 1
+        return data
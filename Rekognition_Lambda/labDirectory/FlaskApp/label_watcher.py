@@ -0,0 +1,83 @@
+from contextlib import contextmanager
+import threading
+import time
+
+
+class Watch:
+    """
+    One image's labels being waited for. Every client waiting on the image
+    shares it.
+    """
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.data = None
+        self.waiters = 0
+
+    def wait(self, timeout):
+        """
+        The label document once it exists, or None if timeout seconds pass
+        first.
+        """
+        self.ready.wait(timeout)
+        return self.data
+
+
+class LabelWatcher:
+    """
+    Waits for label documents to appear in the labels bucket.
+
+    Each image being waited for gets a single polling thread, however many
+    clients wait on it. The thread reads through the LabelCache, so a poll
+    costs one GET per poll_interval (by default the cache's negative TTL),
+    and the labels it finds are already cached when /check_labels asks for
+    them. The thread stops when the labels are found or when its last client
+    leaves.
+    """
+
+    def __init__(self, cache, poll_interval=None):
+        self.cache = cache
+        self.poll_interval = cache.negative_ttl if poll_interval is None else poll_interval
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def watching(self, image_name):
+        """
+        Register as a client waiting on image_name's labels, for the
+        duration of the with block, and yield the shared Watch.
+        """
+        with self._lock:
+            watch = self._watches.get(image_name)
+            if watch is None:
+                watch = self._watches[image_name] = Watch()
+                threading.Thread(target=self._poll, args=(image_name, watch), daemon=True).start()
+            watch.waiters += 1
+        try:
+            yield watch
+        finally:
+            with self._lock:
+                watch.waiters -= 1
+
+    def watched(self):
+        """
+        Number of images being waited for, and of clients waiting on them.
+        """
+        with self._lock:
+            return {"images": len(self._watches), "clients": sum(w.waiters for w in self._watches.values())}
+
+    def _poll(self, image_name, watch):
+        while True:
+            try:
+                watch.data = self.cache.get(image_name)
+            except Exception as e:
+                # Keep waiting; S3 errors are usually transient
+                print(f'Error retrieving labels for {image_name}: {str(e)}')
+            with self._lock:
+                if watch.data is not None or watch.waiters == 0:
+                    # Later clients start a new watch, which finds the
+                    # labels in the cache
+                    del self._watches[image_name]
+                    break
+            time.sleep(self.poll_interval)
+        watch.ready.set()
@@ -0,0 +1,27 @@
+// Label readiness: after an upload, wait on the app's event stream and show
+// the labels as soon as the Lambda has stored them, instead of having the
+// user press Check Labels until they are there.
+document.addEventListener('DOMContentLoaded', () => {
+    const form = document.getElementById('check-labels');
+    const status = document.getElementById('label-status');
+    if (!form || !form.dataset.streamUrl || !window.EventSource) {
+        return;
+    }
+    status.textContent = 'Waiting for labels...';
+    const stream = new EventSource(form.dataset.streamUrl);
+    stream.addEventListener('labels', () => {
+        stream.close();
+        // The labels are cached by now, so this shows them at once
+        form.submit();
+    });
+    stream.addEventListener('timeout', () => {
+        stream.close();
+        status.textContent = 'Labels are taking longer than usual. Use Check Labels to try again.';
+    });
+    stream.addEventListener('error', () => {
+        // The browser reconnects by itself unless the app ended the stream
+        if (stream.readyState === EventSource.CLOSED) {
+            status.textContent = '';
+        }
+    });
+});
@@ -1,92 +1,61 @@
-import paramiko
+import hashlib
 import json
+import os
+import shlex
 import requests
+import ssh_pool
 
-def main():
-    overall = {"data": []}
-    data = []
+SSH_LOG_MARKER = 'Accepted publickey for ec2-user'
 
-    # Load data from data.json
+# Runs on the student's VM and gathers everything the tests need in one
+# channel: only the matching log lines, the private IP and a hash of the
+# user data. Written for both the python3 and python2 found on the AMIs.
+PROBE_SCRIPT = """
+import hashlib, json, subprocess
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+def metadata(path):
     try:
-        with open('data.json', 'r') as f:
-            data_json = json.load(f)
-    except Exception as e:
-        overall['data'] = [
-            {
-                "testid": "Connect to Public VM",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": f"Failed to load data.json: {str(e)}"
-            },
-            {
-                "testid": "Check Private IP of Public VM",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "Required data not available due to missing data.json."
-            },
-            {
-                "testid": "Verify User Data Script Content",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "Data.json missing, cannot verify user data."
-            },
-            {
-                "testid": "Verify Flask Application Accessibility",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "Data.json missing, cannot check Flask app."
-            }
-        ]
-        with open('../evaluate.json', 'w') as f:
-            json.dump(overall, f, indent=4)
-        return
+        return urlopen('http://169.254.169.254/latest/' + path, timeout=5).read().decode('utf-8', 'replace')
+    except Exception:
+        return ''
+log = subprocess.Popen('sudo cat /var/log/secure | grep sshd', shell=True, stdout=subprocess.PIPE).communicate()[0]
+log = log.decode('utf-8', 'replace')
+print(json.dumps({
+    'ssh_log': [line for line in log.splitlines() if MARKER in line][-20:],
+    'private_ip': metadata('meta-data/local-ipv4').strip(),
+    'user_data_sha256': hashlib.sha256(metadata('user-data').strip().encode('utf-8')).hexdigest(),
+}))
+""".replace('MARKER', repr(SSH_LOG_MARKER))
+PROBE_COMMAND = f"python3 -c {shlex.quote(PROBE_SCRIPT)} 2>/dev/null || python -c {shlex.quote(PROBE_SCRIPT)}"
+# Seconds a remote command may go without producing output
+COMMAND_TIMEOUT = 30
 
-    ssh = None
-    # Attempt SSH connection
+def connect(data_json):
+    return ssh_pool.get_connection(
+        data_json['public_ip'],
+        "instructor",
+        data_json.get('key_file', "instructor_public_vm.pem"),
+        int(data_json.get('ssh_port', 22))
+    )
+
+def run_probe(ssh):
+    """
+    Run the probe bundle and return its result, or None if the VM could not
+    run it (the tests then fall back to one command each).
+    """
     try:
-        key = paramiko.RSAKey.from_private_key_file("instructor_public_vm.pem")
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(hostname=data_json['public_ip'], username="instructor", pkey=key)
-    except Exception as e:
-        overall['data'] = [
-            {
-                "testid": "Connect to Public VM",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": f"SSH connection failed: {str(e)}"
-            },
-            {
-                "testid": "Check Private IP of Public VM",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "SSH connection not established; cannot check private IP."
-            },
-            {
-                "testid": "Verify User Data Script Content",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "SSH connection failed; cannot verify user data."
-            },
-            {
-                "testid": "Verify Flask Application Accessibility",
-                "status": "failure",
-                "score": 0,
-                "maximum marks": 1,
-                "message": "SSH connection failed; Flask check skipped."
-            }
-        ]
-        with open('../evaluate.json', 'w') as f:
-            json.dump(overall, f, indent=4)
-        return
+        stdin, stdout, stderr = ssh.exec_command(PROBE_COMMAND, timeout=COMMAND_TIMEOUT)
+        probe = json.loads(stdout.read().decode())
+    except ValueError:
+        return None
+    if not isinstance(probe, dict) or not {'ssh_log', 'private_ip', 'user_data_sha256'} <= set(probe):
+        return None
+    return probe
 
+def check_ssh_log(ssh, data, probe=None):
     # Test Case 1: Check SSH log for successful login
     test1 = {
         "testid": "Connect to Public VM",
@@ -96,9 +65,12 @@ def main():
         "message": ""
     }
     try:
-        stdin, stdout, stderr = ssh.exec_command("sudo cat /var/log/secure | grep sshd")
-        ssh_log = stdout.read().decode().strip()
-        if 'Accepted publickey for ec2-user' in ssh_log:
+        if probe is not None:
+            ssh_log = "\n".join(probe['ssh_log'])
+        else:
+            stdin, stdout, stderr = ssh.exec_command("sudo cat /var/log/secure | grep sshd", timeout=COMMAND_TIMEOUT)
+            ssh_log = stdout.read().decode().strip()
+        if SSH_LOG_MARKER in ssh_log:
             test1["status"] = "success"
             test1["score"] = 1
             test1["message"] = "SSH log contains successful login entry."
@@ -108,6 +80,7 @@ def main():
         test1["message"] = f"Error accessing SSH log: {str(e)}"
     data.append(test1)
 
+def check_private_ip(ssh, data_json, data, probe=None):
     # Test Case 2: Check private IP of the public VM
     test2 = {
         "testid": "Check Private IP of Public VM",
@@ -117,8 +90,11 @@ def main():
         "message": ""
     }
     try:
-        stdin, stdout, stderr = ssh.exec_command("curl -s http://169.254.169.254/latest/meta-data/local-ipv4")
-        private_ip = stdout.read().decode().strip()
+        if probe is not None:
+            private_ip = probe['private_ip']
+        else:
+            stdin, stdout, stderr = ssh.exec_command("curl -s http://169.254.169.254/latest/meta-data/local-ipv4", timeout=COMMAND_TIMEOUT)
+            private_ip = stdout.read().decode().strip()
         expected_ip = data_json.get('private_ip_public_vm', '')
         if private_ip == expected_ip:
             test2["status"] = "success"
@@ -130,6 +106,7 @@ def main():
         test2["message"] = f"Error retrieving private IP: {str(e)}"
     data.append(test2)
 
+def check_user_data(ssh, data_json, data, probe=None):
     # Test Case 3: Verify User Data Script Content
     test3 = {
         "testid": "Verify User Data Script Content",
@@ -140,26 +117,31 @@ def main():
     }
     try:
         # Read local userData.txt
-        with open('userData.txt', 'r') as f:
+        with open(data_json.get('user_data_file', 'userData.txt'), 'r') as f:
             local_user_data = f.read().strip()
     except Exception as e:
         test3["message"] = f"Error reading local userData.txt: {str(e)}"
         data.append(test3)
-    else:
-        try:
+        return
+    try:
+        if probe is not None:
+            matches = probe['user_data_sha256'] == hashlib.sha256(local_user_data.encode('utf-8')).hexdigest()
+        else:
             # Execute command to get remote user data
-            stdin, stdout, stderr = ssh.exec_command("curl -s http://169.254.169.254/latest/user-data")
+            stdin, stdout, stderr = ssh.exec_command("curl -s http://169.254.169.254/latest/user-data", timeout=COMMAND_TIMEOUT)
             remote_user_data = stdout.read().decode().strip()
-            if remote_user_data == local_user_data:
-                test3["status"] = "success"
-                test3["score"] = 1
-                test3["message"] = "User data matches."
-            else:
-                test3["message"] = "User data does not match."
-        except Exception as e:
-            test3["message"] = f"Error retrieving remote user data: {str(e)}"
-        data.append(test3)
+            matches = remote_user_data == local_user_data
+        if matches:
+            test3["status"] = "success"
+            test3["score"] = 1
+            test3["message"] = "User data matches."
+        else:
+            test3["message"] = "User data does not match."
+    except Exception as e:
+        test3["message"] = f"Error retrieving remote user data: {str(e)}"
+    data.append(test3)
 
+def check_flask_app(data_json, data):
     # Test Case 4: Verify Flask Application Accessibility
     test4 = {
         "testid": "Verify Flask Application Accessibility",
@@ -172,25 +154,134 @@ def main():
     if not public_ip:
         test4["message"] = "Public IP not found in data.json."
         data.append(test4)
-    else:
+        return
+    try:
+        app_port = data_json.get('app_port')
+        url = f"http://{public_ip}:{app_port}" if app_port else f"http://{public_ip}"
+        response = requests.get(url, timeout=10)
+        if response.status_code == 200 and "Welcome! Here is some info about me!" in response.text:
+            test4["status"] = "success"
+            test4["score"] = 1
+            test4["message"] = "Flask application is accessible and contains the welcome message."
+        else:
+            test4["message"] = f"Unexpected status code {response.status_code} or Flask application is not accessible"
+    except requests.exceptions.RequestException as e:
+        test4["message"] = f"Error accessing Flask application: {str(e)}"
+    except Exception as e:
+        test4["message"] = f"Unexpected error: {str(e)}"
+    data.append(test4)
+
+def grade(data_json):
+    data = []
+
+    # Attempt SSH connection
+    try:
+        ssh = connect(data_json)
+    except Exception as e:
+        return [
+            {
+                "testid": "Connect to Public VM",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": f"SSH connection failed: {str(e)}"
+            },
+            {
+                "testid": "Check Private IP of Public VM",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "SSH connection not established; cannot check private IP."
+            },
+            {
+                "testid": "Verify User Data Script Content",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "SSH connection failed; cannot verify user data."
+            },
+            {
+                "testid": "Verify Flask Application Accessibility",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "SSH connection failed; Flask check skipped."
+            }
+        ]
+
+    # One channel for all three SSH tests; the connection stays in the
+    # pool for the next student on the same host
+    try:
         try:
-            response = requests.get(f"http://{public_ip}", timeout=10)
-            if response.status_code == 200 and "Welcome! Here is some info about me!" in response.text:
-                test4["status"] = "success"
-                test4["score"] = 1
-                test4["message"] = "Flask application is accessible and contains the welcome message."
-            else:
-                test4["message"] = f"Unexpected status code {response.status_code} or Flask application is not accessible"
-        except requests.exceptions.RequestException as e:
-            test4["message"] = f"Error accessing Flask application: {str(e)}"
-        except Exception as e:
-            test4["message"] = f"Unexpected error: {str(e)}"
-        data.append(test4)
+            probe = run_probe(ssh)
+        except Exception:
+            probe = None
+        check_ssh_log(ssh, data, probe)
+        check_private_ip(ssh, data_json, data, probe)
+        check_user_data(ssh, data_json, data, probe)
+    finally:
+        ssh_pool.release(ssh)
+    check_flask_app(data_json, data)
+
+    return data
+
+def evaluate(lab_directory='.'):
+    """
+    Grade the submission in lab_directory and return the evaluate.json payload.
+    """
+    overall = {"data": []}
+
+    # Load data from data.json
+    try:
+        with open(os.path.join(lab_directory, 'data.json'), 'r') as f:
+            data_json = json.load(f)
+    except Exception as e:
+        overall['data'] = [
+            {
+                "testid": "Connect to Public VM",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": f"Failed to load data.json: {str(e)}"
+            },
+            {
+                "testid": "Check Private IP of Public VM",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "Required data not available due to missing data.json."
+            },
+            {
+                "testid": "Verify User Data Script Content",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "Data.json missing, cannot verify user data."
+            },
+            {
+                "testid": "Verify Flask Application Accessibility",
+                "status": "failure",
+                "score": 0,
+                "maximum marks": 1,
+                "message": "Data.json missing, cannot check Flask app."
+            }
+        ]
+        return overall
 
-    # Close SSH connection
-    ssh.close()
+    # The key and the expected user data sit next to data.json. data.json
+    # itself is the student's, so it may not point the grader at other files
+    # or ports; only batch.py rosters of stand-in VMs set those.
+    if isinstance(data_json, dict):
+        data_json['key_file'] = os.path.join(lab_directory, "instructor_public_vm.pem")
+        data_json['user_data_file'] = os.path.join(lab_directory, 'userData.txt')
+        data_json.pop('ssh_port', None)
+        data_json.pop('app_port', None)
+    overall['data'] = grade(data_json)
+    return overall
 
-    overall['data'] = data
+def main():
+    overall = evaluate()
+    ssh_pool.default_pool.close()
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
 
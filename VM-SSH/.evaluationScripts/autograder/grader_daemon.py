@@ -0,0 +1,139 @@
+"""
+Long-lived grading daemon for one lab.
+
+Start it once per container, before any submission is graded:
+
+    python3 grader_daemon.py serve &
+
+It imports the lab's grader and every library the checks use, then listens on
+a Unix socket (GRADER_DAEMON_SOCKET, default /tmp/grader_daemon.sock). Each
+submission is graded in a thread of the same process, so interpreter start,
+imports, AWS clients, SSH connections and the reference fingerprint stay warm
+between students. evaluate.sh submits the lab directory through the client,
+which only uses the standard library:
+
+    python3 grader_daemon.py submit /home/labDirectory --output ../evaluate.json
+
+The client exits non-zero when no daemon answers, and evaluate.sh then runs
+the grader directly as before. The protocol is one JSON line each way:
+{"lab_directory": path} in, {"ok": true, "result": <evaluate.json payload>}
+or {"ok": false, "error": message} out.
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+SOCKET_PATH = os.environ.get('GRADER_DAEMON_SOCKET', '/tmp/grader_daemon.sock')
+# Seconds the client waits for a result before falling back
+SUBMIT_TIMEOUT = float(os.environ.get('GRADER_DAEMON_TIMEOUT', '600'))
+
+
+class SubmissionHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            result = self.server.autograder.evaluate(request['lab_directory'])
+            response = {"ok": True, "result": result}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class GraderDaemon(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=SOCKET_PATH):
+        remove_stale_socket(path)
+        # The graders open their own files (reference image, fingerprint)
+        # relative to the autograder directory
+        os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        import autograder
+        import lazy_imports
+
+        lazy_imports.preload()
+        self.autograder = autograder
+        super().__init__(path, SubmissionHandler)
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def remove_stale_socket(path):
+    """
+    Remove a socket left behind by a daemon that died; refuse to replace a
+    daemon that still answers.
+    """
+    if not os.path.exists(path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+            return
+    raise RuntimeError(f"a grader daemon is already listening on {path}")
+
+
+def submit(lab_directory, path=SOCKET_PATH, timeout=SUBMIT_TIMEOUT):
+    """
+    Have the daemon grade lab_directory and return the evaluate.json payload.
+    """
+    request = json.dumps({"lab_directory": os.path.abspath(lab_directory)}).encode() + b"\n"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(request)
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error", "grading failed"))
+    return response["result"]
+
+
+def serve(path=SOCKET_PATH):
+    server = GraderDaemon(path)
+    # Stop cleanly on docker stop as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"Grading on {path}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the grader warm between submissions.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Unix socket to listen on or connect to")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="run the daemon")
+    submit_parser = commands.add_parser("submit", help="grade a lab directory through the daemon")
+    submit_parser.add_argument("lab_directory")
+    submit_parser.add_argument("--output", default="../evaluate.json", help="where to write the result")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            serve(args.socket)
+        except RuntimeError as e:
+            sys.exit(str(e))
+        return
+    try:
+        result = submit(args.lab_directory, args.socket)
+    except (OSError, ValueError, RuntimeError) as e:
+        sys.exit(f"grader daemon unavailable: {e}")
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=4)
+
+if __name__ == "__main__":
+    main()
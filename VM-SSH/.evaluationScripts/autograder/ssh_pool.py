@@ -0,0 +1,321 @@
+"""
+Shared SSH connections for the VM-SSH grader.
+
+Connections are cached per (host, port, user, key file), so grading the
+same machine again in one process (regrades in a batch, or several students
+behind one bastion) reuses the authenticated transport and only opens a new
+channel. A cached connection whose transport has died is replaced
+transparently. Callers release() a connection when done with it; only
+released connections are closed to make room for new ones.
+
+Every connection attempt is bounded by CONNECT_TIMEOUT (TCP connect, SSH
+banner and authentication each), and at most MAX_CONNECTS handshakes run at
+once across all threads, so fanning out over a whole section cannot exhaust
+file descriptors or stall on unreachable VMs.
+
+The instructor key is parsed once per process, and the client neither asks an
+SSH agent nor tries other key files. Host keys are trusted on first use and
+kept in a known-hosts file keyed by the student's address
+(GRADER_SSH_KNOWN_HOSTS, empty to keep them in memory only), so a regrade
+offers the server its own key type first. Students relaunch instances and
+addresses get reused, so by default a host that presents a different key is
+trusted and its entry replaced, as paramiko's AutoAddPolicy would; the store
+then only records which key type to offer. GRADER_SSH_REPLACE_HOST_KEYS=0
+makes a changed key fail the connection instead. Slow key exchanges
+(Diffie-Hellman group exchange and the large MODP groups) and CBC ciphers are
+not offered.
+"""
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import lazy_imports
+
+paramiko = lazy_imports.lazy('paramiko')
+
+# Upper bound on open connections; the least recently used one is closed first
+POOL_SIZE = int(os.environ.get('GRADER_SSH_POOL_SIZE', '32'))
+# Seconds allowed for each phase of connecting to a VM
+CONNECT_TIMEOUT = float(os.environ.get('GRADER_SSH_CONNECT_TIMEOUT', '10'))
+# Handshakes in progress at once, across all threads
+MAX_CONNECTS = int(os.environ.get('GRADER_SSH_MAX_CONNECTS', '64'))
+KNOWN_HOSTS = os.environ.get('GRADER_SSH_KNOWN_HOSTS', os.path.expanduser('~/.ssh/grader_known_hosts'))
+# Set to 0 to fail a host whose key changed instead of replacing its stored key
+REPLACE_HOST_KEYS = os.environ.get('GRADER_SSH_REPLACE_HOST_KEYS', '1') == '1'
+# Negotiation never picks these; names this paramiko does not know are ignored
+DISABLED_ALGORITHMS = {
+    'kex': [
+        'diffie-hellman-group-exchange-sha256',
+        'diffie-hellman-group-exchange-sha1',
+        'diffie-hellman-group16-sha512',
+        'diffie-hellman-group14-sha1',
+        'diffie-hellman-group1-sha1',
+    ],
+    'ciphers': ['aes128-cbc', 'aes192-cbc', 'aes256-cbc', '3des-cbc', 'blowfish-cbc'],
+}
+
+_private_keys = {}
+_private_key_lock = threading.Lock()
+
+
+def load_private_key(key_file):
+    """
+    The RSA key in key_file, parsed once per process (again if the file
+    changes).
+    """
+    path = os.path.abspath(key_file)
+    mtime = os.stat(path).st_mtime_ns
+    with _private_key_lock:
+        cached = _private_keys.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, paramiko.RSAKey.from_private_key_file(path))
+            _private_keys[path] = cached
+        return cached[1]
+
+
+class KnownHosts:
+    """
+    Thread-safe host key store, saved to path after every change.
+
+    The file is only a cache: if it cannot be read or written, the keys are
+    kept in memory and the failure is reported once, so it never fails a
+    connection.
+    """
+
+    def __init__(self, path=KNOWN_HOSTS):
+        self.path = path
+        self._host_keys = None
+        self._lock = threading.Lock()
+
+    @property
+    def _keys(self):
+        # Read on first use, under the lock, so creating the default pool
+        # neither loads paramiko nor touches the file
+        if self._host_keys is None:
+            self._host_keys = paramiko.HostKeys()
+            if self.path and os.path.exists(self.path):
+                try:
+                    self._host_keys.load(self.path)
+                except OSError as e:
+                    self._give_up_file(e)
+        return self._host_keys
+
+    def lookup(self, name):
+        with self._lock:
+            entry = self._keys.lookup(name)
+            return dict(entry) if entry else {}
+
+    def remember(self, name, key):
+        """
+        Store key as the only key of name.
+        """
+        with self._lock:
+            self._keys.pop(name, None)
+            self._keys.add(name, key.get_name(), key)
+            self._save()
+
+    def forget(self, name):
+        with self._lock:
+            if self._keys.pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # Write a sibling and rename it, so concurrent graders never
+            # read a half-written file
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.known_hosts.')
+            os.close(fd)
+            self._keys.save(tmp_path)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            self._give_up_file(e)
+
+    def _give_up_file(self, error):
+        # Called with the lock held; later changes stay in memory only
+        print(f"Host keys kept in memory only, {self.path} is not usable: {error}", file=sys.stderr)
+        self.path = None
+
+
+class TrustOnFirstUse:
+    """
+    Missing host key policy that accepts an unknown host and records its key.
+    """
+
+    def __init__(self, known_hosts):
+        self.known_hosts = known_hosts
+
+    def missing_host_key(self, client, hostname, key):
+        self.known_hosts.remember(hostname, key)
+
+
+def host_key_name(hostname, port):
+    # The form known_hosts files and paramiko use for a host
+    return hostname if port == 22 else f"[{hostname}]:{port}"
+
+
+class SSHPool:
+    """
+    Thread-safe LRU cache of connected paramiko SSHClients.
+    """
+
+    def __init__(self, max_size=POOL_SIZE, connect_timeout=CONNECT_TIMEOUT, max_connects=MAX_CONNECTS,
+                 known_hosts=None, replace_host_keys=REPLACE_HOST_KEYS):
+        self.max_size = max_size
+        self.connect_timeout = connect_timeout
+        self.replace_host_keys = replace_host_keys
+        self.known_hosts = known_hosts if known_hosts is not None else KnownHosts()
+        self._connect_slots = threading.BoundedSemaphore(max_connects)
+        self._clients = OrderedDict()
+        # Number of callers currently using each cached connection
+        self._leases = {}
+        self._lock = threading.Lock()
+        # One lock per key while it is being connected to, so a host is
+        # connected to once even when several threads ask for it at once
+        self._connect_locks = {}
+
+    def connection(self, hostname, username, key_file, port=22):
+        key = (hostname, port, username, key_file)
+        with self._lock:
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+        try:
+            with connect_lock:
+                client = self._lookup(key)
+                if client is None:
+                    with self._connect_slots:
+                        client = self._connect(hostname, port, username, key_file)
+                    self._store(key, client)
+                return client
+        finally:
+            # Threads already waiting keep the lock they got; later ones find
+            # the cached connection, so the entry is not needed any more
+            with self._lock:
+                if self._connect_locks.get(key) is connect_lock:
+                    del self._connect_locks[key]
+
+    def release(self, client):
+        with self._lock:
+            for key, cached in self._clients.items():
+                if cached is client:
+                    self._leases[key] -= 1
+                    break
+        self._evict()
+
+    def discard(self, hostname, username, key_file, port=22):
+        with self._lock:
+            client = self._clients.pop((hostname, port, username, key_file), None)
+            self._leases.pop((hostname, port, username, key_file), None)
+        if client is not None:
+            client.close()
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._leases.clear()
+        for client in clients:
+            client.close()
+
+    def _connect(self, hostname, port, username, key_file):
+        try:
+            return self._connect_once(hostname, port, username, key_file)
+        except paramiko.BadHostKeyException:
+            if not self.replace_host_keys:
+                raise
+            # Presumably a new instance behind a reused address
+            self.known_hosts.forget(host_key_name(hostname, port))
+            return self._connect_once(hostname, port, username, key_file)
+
+    def _connect_once(self, hostname, port, username, key_file):
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(TrustOnFirstUse(self.known_hosts))
+        name = host_key_name(hostname, port)
+        for key_type, host_key in self.known_hosts.lookup(name).items():
+            client.get_host_keys().add(name, key_type, host_key)
+        try:
+            client.connect(
+                hostname=hostname,
+                port=port,
+                username=username,
+                pkey=load_private_key(key_file),
+                timeout=self.connect_timeout,
+                banner_timeout=self.connect_timeout,
+                auth_timeout=self.connect_timeout,
+                allow_agent=False,
+                look_for_keys=False,
+                disabled_algorithms=DISABLED_ALGORITHMS
+            )
+        except Exception:
+            client.close()
+            raise
+        return client
+
+    def _lookup(self, key):
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                return None
+            transport = client.get_transport()
+            if transport is None or not transport.is_active():
+                del self._clients[key]
+                # Whoever still holds the dead connection fails on their own
+                self._leases.pop(key, None)
+                stale = client
+            else:
+                self._clients.move_to_end(key)
+                self._leases[key] += 1
+                return client
+        stale.close()
+        return None
+
+    def _store(self, key, client):
+        with self._lock:
+            self._clients[key] = client
+            self._leases[key] = 1
+        self._evict()
+
+    def _evict(self):
+        # Close the least recently used idle connections; connections in use
+        # may take the pool over max_size until they are released
+        evicted = []
+        with self._lock:
+            for key in list(self._clients):
+                if len(self._clients) <= self.max_size:
+                    break
+                if self._leases[key] == 0:
+                    evicted.append(self._clients.pop(key))
+                    del self._leases[key]
+        for old in evicted:
+            old.close()
+
+
+default_pool = SSHPool()
+
+
+def configure(max_size=None, connect_timeout=None, max_connects=None):
+    """
+    Replace the process-wide pool with one using the given limits.
+    """
+    global default_pool
+    default_pool = SSHPool(
+        max_size=max_size or POOL_SIZE,
+        connect_timeout=connect_timeout or CONNECT_TIMEOUT,
+        max_connects=max_connects or MAX_CONNECTS,
+        known_hosts=default_pool.known_hosts
+    )
+
+
+def get_connection(hostname, username, key_file, port=22):
+    return default_pool.connection(hostname, username, key_file, port)
+
+
+def release(client):
+    default_pool.release(client)
@@ -0,0 +1,246 @@
+"""
+Local stand-ins for the students' VMs, for testing and benchmarking the
+VM-SSH grader without EC2.
+
+    python3 ssh_standin.py --students 200 --dead 5 --dir /tmp/vms
+
+writes an instructor key pair, the expected user data and a roster to --dir,
+then serves every student's VM on its own loopback address (127.x.y.z): an
+SSH server that accepts the instructor key and answers the grader's commands
+(the probe bundle as well as the single commands), and the Flask welcome page.
+Dead VMs accept TCP connections and then never answer, like an instance whose
+SSH daemon hangs, so the grader's timeouts are exercised too. Grade the
+roster from another shell, keeping host keys in memory since every run of
+the stand-in has a new one:
+
+    GRADER_SSH_KNOWN_HOSTS= python3 batch.py /tmp/vms/roster.jsonl results.jsonl --workers 64
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import paramiko
+
+import loopback
+
+SSH_LOG_MARKER = 'Accepted publickey for ec2-user'
+WELCOME_PAGE = b"<html><body><h1>Welcome! Here is some info about me!</h1></body></html>"
+
+
+class StandInVM:
+    """
+    What one student's VM reports.
+    """
+
+    def __init__(self, address, private_ip, user_data, logged_in=True, app_running=True, dead=False):
+        self.address = address
+        self.private_ip = private_ip
+        self.user_data = user_data
+        self.logged_in = logged_in
+        self.app_running = app_running
+        self.dead = dead
+
+    def ssh_log(self):
+        lines = ["sshd[1021]: Server listening on 0.0.0.0 port 22."]
+        if self.logged_in:
+            lines.append(f"sshd[2214]: {SSH_LOG_MARKER} from 203.0.113.7 port 50522 ssh2")
+        return lines
+
+    def run(self, command):
+        """
+        Output of a command the grader sends.
+        """
+        if 'urlopen' in command:
+            return json.dumps({
+                'ssh_log': [line for line in self.ssh_log() if SSH_LOG_MARKER in line],
+                'private_ip': self.private_ip,
+                'user_data_sha256': hashlib.sha256(self.user_data.strip().encode('utf-8')).hexdigest(),
+            }) + "\n"
+        if '/var/log/secure' in command:
+            return "\n".join(self.ssh_log()) + "\n"
+        if 'local-ipv4' in command:
+            return self.private_ip
+        if 'user-data' in command:
+            return self.user_data
+        return ""
+
+
+class StandInServer(paramiko.ServerInterface):
+    def __init__(self, vm, authorized_key):
+        self.vm = vm
+        self.authorized_key = authorized_key
+
+    def get_allowed_auths(self, username):
+        return 'publickey'
+
+    def check_auth_publickey(self, username, key):
+        if username == 'instructor' and key == self.authorized_key:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        # Reply once paramiko has acknowledged the request
+        threading.Thread(target=self.reply, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+    def reply(self, channel, command):
+        channel.sendall(self.vm.run(command).encode())
+        channel.send_exit_status(0)
+        # EOF rather than close, which could overtake paramiko's answer to
+        # the exec request; the grader closes the channel when it is done
+        channel.shutdown_write()
+
+
+class VMFarm:
+    """
+    Serves a set of StandInVMs, one per loopback address, on two ports.
+    """
+
+    def __init__(self, vms, authorized_key, ssh_port=0, app_port=0):
+        self.vms = {vm.address: vm for vm in vms}
+        self.authorized_key = authorized_key
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.stopped = threading.Event()
+
+        self.ssh_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.ssh_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.ssh_socket.bind(('0.0.0.0', ssh_port))
+        self.ssh_socket.listen(1024)
+        self.ssh_port = self.ssh_socket.getsockname()[1]
+
+        farm = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                vm = farm.vms.get(self.connection.getsockname()[0])
+                if vm is None or vm.dead or not vm.app_running:
+                    self.send_error(502)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(WELCOME_PAGE)))
+                self.end_headers()
+                self.wfile.write(WELCOME_PAGE)
+
+        self.http_server = ThreadingHTTPServer(('0.0.0.0', app_port), Handler)
+        self.http_server.daemon_threads = True
+        self.app_port = self.http_server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.ssh_socket.close()
+        self.http_server.shutdown()
+        self.http_server.server_close()
+
+    def accept_loop(self):
+        while not self.stopped.is_set():
+            try:
+                sock, _ = self.ssh_socket.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.serve_connection, args=(sock,), daemon=True).start()
+
+    def serve_connection(self, sock):
+        vm = self.vms.get(sock.getsockname()[0])
+        if vm is None or vm.dead:
+            # Hold the connection open without ever sending a banner
+            self.stopped.wait()
+            sock.close()
+            return
+        transport = paramiko.Transport(sock)
+        transport.add_server_key(self.host_key)
+        try:
+            transport.start_server(server=StandInServer(vm, self.authorized_key))
+            # Channels are answered by StandInServer (accepting them here
+            # would let them be garbage collected, which closes them); keep
+            # the transport open until the grader closes it
+            while transport.is_active() and not self.stopped.wait(1):
+                pass
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            transport.close()
+
+
+def generate(directory, students, dead=0, broken_rate=0.1, seed=0, ssh_port=0, app_port=0):
+    """
+    Write the instructor key, user data and roster for a synthetic section
+    and return the VMFarm (not yet started) that serves it.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    key_file = os.path.join(directory, 'instructor_public_vm.pem')
+    key = paramiko.RSAKey.generate(2048)
+    key.write_private_key_file(key_file)
+    user_data_file = os.path.join(directory, 'userData.txt')
+    user_data = "#!/bin/bash -ex\nsudo yum update -y\nsudo pip install flask\n"
+    with open(user_data_file, 'w') as f:
+        f.write(user_data)
+
+    vms = []
+    dead_indices = set(rng.sample(range(students), min(dead, students)))
+    for index in range(students):
+        broken = rng.random() < broken_rate
+        vms.append(StandInVM(
+            loopback.loopback_address(index),
+            f"10.0.{(index >> 8) & 255}.{index & 255}",
+            user_data if not broken else user_data + "sudo yum install -y httpd\n",
+            logged_in=not (broken and rng.random() < 0.5),
+            app_running=not broken,
+            dead=index in dead_indices
+        ))
+    farm = VMFarm(vms, paramiko.RSAKey(filename=key_file), ssh_port, app_port)
+
+    with open(os.path.join(directory, 'roster.jsonl'), 'w') as f:
+        for index, vm in enumerate(vms):
+            f.write(json.dumps({
+                'student_id': f"student-{index:05d}",
+                'public_ip': vm.address,
+                'private_ip_public_vm': vm.private_ip,
+                'key_file': key_file,
+                'user_data_file': user_data_file,
+                'ssh_port': farm.ssh_port,
+                'app_port': farm.app_port,
+            }) + "\n")
+    return farm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve stand-in student VMs for the VM-SSH grader.")
+    parser.add_argument("--dir", required=True, help="where to write the key, user data and roster")
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--dead", type=int, default=0, help="number of VMs that never answer")
+    parser.add_argument("--broken-rate", type=float, default=0.1, help="fraction of misconfigured VMs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ssh-port", type=int, default=2222)
+    parser.add_argument("--app-port", type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    farm = generate(args.dir, args.students, args.dead, args.broken_rate, args.seed, args.ssh_port, args.app_port)
+    farm.start()
+    print(f"Serving {len(farm.vms)} VMs (SSH port {farm.ssh_port}, app port {farm.app_port}); "
+          f"roster in {os.path.join(args.dir, 'roster.jsonl')}", flush=True)
+    try:
+        farm.stopped.wait()
+    except KeyboardInterrupt:
+        farm.stop()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 import json
-import boto3
+import os
+import aws_clients
+from scheduler import Check, run_checks
+from topology import fetch_topology
 
-def check_vpc(ec2_client, data):
+def check_vpc(topology, data):
     result = {
         "testid": "VPC Configuration",
         "status": "failure",
@@ -10,13 +13,11 @@ def check_vpc(ec2_client, data):
         "message": ""
     }
     try:
-        response = ec2_client.describe_vpcs(Filters=[{'Name': 'tag:Name', 'Values': ['aws-vpc']}])
-        vpcs = response.get('Vpcs', [])
-        if not vpcs:
+        vpc = topology.vpcs_by_name.get('aws-vpc')
+        if not vpc:
             result["message"] = "VPC named 'aws-vpc' not found."
             data.append(result)
             return None
-        vpc = vpcs[0]
         vpc_id = vpc['VpcId']
         if vpc['CidrBlock'] == '10.1.0.0/16':
             result["status"] = "success"
@@ -31,7 +32,7 @@ def check_vpc(ec2_client, data):
         data.append(result)
         return None
 
-def check_igw(ec2_client, vpc_id, data):
+def check_igw(topology, vpc_id, data):
     result = {
         "testid": "Internet Gateway Verification",
         "status": "failure",
@@ -40,13 +41,11 @@ def check_igw(ec2_client, vpc_id, data):
         "message": ""
     }
     try:
-        response = ec2_client.describe_internet_gateways(Filters=[{'Name': 'tag:Name', 'Values': ['aws-igw']}])
-        igws = response.get('InternetGateways', [])
-        if not igws:
+        igw = topology.internet_gateways_by_name.get('aws-igw')
+        if not igw:
             result["message"] = "Internet Gateway 'aws-igw' not found."
             data.append(result)
             return None
-        igw = igws[0]
         igw_id = igw['InternetGatewayId']
         attached = any(attachment['VpcId'] == vpc_id for attachment in igw.get('Attachments', []))
         if attached:
@@ -62,7 +61,7 @@ def check_igw(ec2_client, vpc_id, data):
         data.append(result)
         return None
 
-def check_public_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expected_az, public_route_table_id, data):
+def check_public_subnet(topology, vpc_id, subnet_name, expected_cidr, expected_az, public_route_table_id, data):
     result = {
         "testid": f"Public Subnet {subnet_name}",
         "status": "failure",
@@ -71,13 +70,11 @@ def check_public_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expected
         "message": ""
     }
     try:
-        response = ec2_client.describe_subnets(Filters=[{'Name': 'tag:Name', 'Values': [subnet_name]}])
-        subnets = response.get('Subnets', [])
-        if not subnets:
+        subnet = topology.subnets_by_name.get(subnet_name)
+        if not subnet:
             result["message"] = f"Public Subnet {subnet_name} not found."
             data.append(result)
             return
-        subnet = subnets[0]
         if subnet['VpcId'] != vpc_id:
             result["message"] = f"Public Subnet {subnet_name} is not in the correct VPC."
             data.append(result)
@@ -94,15 +91,11 @@ def check_public_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expected
             result["message"] = f"Public Subnet {subnet_name} does not have MapPublicIpOnLaunch enabled."
             data.append(result)
             return
-        rt_response = ec2_client.describe_route_tables(Filters=[
-            {'Name': 'association.subnet-id', 'Values': [subnet['SubnetId']]}
-        ])
-        route_tables = rt_response.get('RouteTables', [])
-        if not route_tables:
+        route_table = topology.route_table_by_subnet.get(subnet['SubnetId'])
+        if not route_table:
             result["message"] = f"Public Subnet {subnet_name} is not associated with any route table."
             data.append(result)
             return
-        route_table = route_tables[0]
         if route_table['RouteTableId'] != public_route_table_id:
             result["message"] = f"Public Subnet {subnet_name} is not associated with the correct public route table."
             data.append(result)
@@ -114,7 +107,7 @@ def check_public_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expected
         result["message"] = f"Error checking Public Subnet {subnet_name}: {e}"
     data.append(result)
 
-def check_private_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expected_az, public_route_table_id, igw_id, data):
+def check_private_subnet(topology, vpc_id, subnet_name, expected_cidr, expected_az, public_route_table_id, igw_id, data):
     result = {
         "testid": f"Private Subnet {subnet_name}",
         "status": "failure",
@@ -123,13 +116,11 @@ def check_private_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expecte
         "message": ""
     }
     try:
-        response = ec2_client.describe_subnets(Filters=[{'Name': 'tag:Name', 'Values': [subnet_name]}])
-        subnets = response.get('Subnets', [])
-        if not subnets:
+        subnet = topology.subnets_by_name.get(subnet_name)
+        if not subnet:
             result["message"] = f"Private Subnet {subnet_name} not found."
             data.append(result)
             return
-        subnet = subnets[0]
         if subnet['VpcId'] != vpc_id:
             result["message"] = f"Private Subnet {subnet_name} is not in the correct VPC."
             data.append(result)
@@ -142,21 +133,13 @@ def check_private_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expecte
             result["message"] = f"Private Subnet {subnet_name} AZ is {subnet['AvailabilityZone']}, expected {expected_az}."
             data.append(result)
             return
-        rt_response = ec2_client.describe_route_tables(Filters=[
-            {'Name': 'association.subnet-id', 'Values': [subnet['SubnetId']]}
-        ])
-        route_tables = rt_response.get('RouteTables', [])
-        if not route_tables:
-            main_rt_response = ec2_client.describe_route_tables(Filters=[
-                {'Name': 'vpc-id', 'Values': [vpc_id]},
-                {'Name': 'association.main', 'Values': ['true']}
-            ])
-            route_tables = main_rt_response.get('RouteTables', [])
-        if not route_tables:
+        route_table = topology.route_table_by_subnet.get(subnet['SubnetId'])
+        if not route_table:
+            route_table = topology.main_route_table.get(vpc_id)
+        if not route_table:
             result["message"] = f"Private Subnet {subnet_name} has no associated route table."
             data.append(result)
             return
-        route_table = route_tables[0]
         if route_table['RouteTableId'] == public_route_table_id:
             result["message"] = f"Private Subnet {subnet_name} is associated with the public route table."
             data.append(result)
@@ -176,7 +159,7 @@ def check_private_subnet(ec2_client, vpc_id, subnet_name, expected_cidr, expecte
         result["message"] = f"Error checking Private Subnet {subnet_name}: {e}"
     data.append(result)
 
-def check_public_route_table(ec2_client, vpc_id, igw_id, data):
+def check_public_route_table(topology, vpc_id, igw_id, data):
     result = {
         "testid": "Public Route Table Configuration",
         "status": "failure",
@@ -185,16 +168,11 @@ def check_public_route_table(ec2_client, vpc_id, igw_id, data):
         "message": ""
     }
     try:
-        response = ec2_client.describe_route_tables(Filters=[
-            {'Name': 'tag:Name', 'Values': ['routetable-public']},
-            {'Name': 'vpc-id', 'Values': [vpc_id]}
-        ])
-        route_tables = response.get('RouteTables', [])
-        if not route_tables:
+        route_table = topology.route_tables_by_name.get('routetable-public')
+        if not route_table or route_table['VpcId'] != vpc_id:
             result["message"] = "Public Route Table 'routetable-public' not found."
             data.append(result)
             return None
-        route_table = route_tables[0]
         public_route_table_id = route_table['RouteTableId']
         has_route = any(
             route.get('DestinationCidrBlock') == '0.0.0.0/0' and route.get('GatewayId') == igw_id
@@ -214,7 +192,7 @@ def check_public_route_table(ec2_client, vpc_id, igw_id, data):
         data.append(result)
         return None
 
-def check_public_route_associations(ec2_client, public_route_table_id, data):
+def check_public_route_associations(topology, public_route_table_id, data):
     result = {
         "testid": "Public Route Table Associations",
         "status": "failure",
@@ -223,13 +201,11 @@ def check_public_route_associations(ec2_client, public_route_table_id, data):
         "message": ""
     }
     try:
-        response = ec2_client.describe_route_tables(RouteTableIds=[public_route_table_id])
-        route_tables = response.get('RouteTables', [])
-        if not route_tables:
+        route_table = topology.route_tables_by_id.get(public_route_table_id)
+        if not route_table:
             result["message"] = "Public Route Table not found."
             data.append(result)
             return
-        route_table = route_tables[0]
         associations = route_table.get('Associations', [])
         public_subnet_ids = []
         for association in associations:
@@ -237,10 +213,9 @@ def check_public_route_associations(ec2_client, public_route_table_id, data):
                 public_subnet_ids.append(association['SubnetId'])
         public_subnets = []
         for name in ['subnet-public-a', 'subnet-public-b']:
-            response = ec2_client.describe_subnets(Filters=[{'Name': 'tag:Name', 'Values': [name]}])
-            subnets = response.get('Subnets', [])
-            if subnets:
-                public_subnets.append(subnets[0]['SubnetId'])
+            subnet = topology.subnets_by_name.get(name)
+            if subnet:
+                public_subnets.append(subnet['SubnetId'])
         missing = [subnet_id for subnet_id in public_subnets if subnet_id not in public_subnet_ids]
         if missing:
             result["message"] = f"Public Route Table is missing associations with subnets: {missing}"
@@ -253,104 +228,87 @@ def check_public_route_associations(ec2_client, public_route_table_id, data):
         result["message"] = f"Error checking Public Route Table associations: {e}"
     data.append(result)
 
-def main():
+def build_checks(ec2_client):
+    checks = [
+        # One snapshot of the whole topology; every other check reads from it
+        Check('topology', lambda out, data: fetch_topology(ec2_client),
+              testids=[],
+              missing_message="Could not read the VPC configuration."),
+        Check('vpc', lambda out, data: check_vpc(out['topology'], data),
+              testids=["VPC Configuration"],
+              requires=['topology'],
+              missing_message="VPC not found."),
+        Check('igw', lambda out, data: check_igw(out['topology'], out['vpc'], data),
+              testids=["Internet Gateway Verification"],
+              requires=['topology', 'vpc'],
+              missing_message="Internet Gateway not found."),
+        Check('public_route_table', lambda out, data: check_public_route_table(out['topology'], out['vpc'], out['igw'], data),
+              testids=["Public Route Table Configuration"],
+              requires=['topology', 'vpc', 'igw'],
+              missing_message="Public Route Table not found."),
+    ]
+    # The four subnet checks only depend on the checks above and run concurrently
+    for subnet_name, expected_cidr, expected_az in [
+        ('subnet-public-a', '10.1.1.0/24', 'us-west-2a'),
+        ('subnet-public-b', '10.1.2.0/24', 'us-west-2b'),
+    ]:
+        checks.append(Check(
+            subnet_name,
+            lambda out, data, args=(subnet_name, expected_cidr, expected_az): check_public_subnet(
+                out['topology'], out['vpc'], *args, out['public_route_table'], data),
+            testids=[f"Public Subnet {subnet_name}"],
+            requires=['topology', 'vpc', 'igw', 'public_route_table']
+        ))
+    for subnet_name, expected_cidr, expected_az in [
+        ('subnet-private-a', '10.1.3.0/24', 'us-west-2a'),
+        ('subnet-private-b', '10.1.4.0/24', 'us-west-2b'),
+    ]:
+        checks.append(Check(
+            subnet_name,
+            lambda out, data, args=(subnet_name, expected_cidr, expected_az): check_private_subnet(
+                out['topology'], out['vpc'], *args, out['public_route_table'], out['igw'], data),
+            testids=[f"Private Subnet {subnet_name}"],
+            requires=['topology', 'vpc', 'igw', 'public_route_table']
+        ))
+    checks.append(Check(
+        'public_route_associations',
+        lambda out, data: check_public_route_associations(out['topology'], out['public_route_table'], data),
+        testids=["Public Route Table Associations"],
+        requires=['topology', 'vpc', 'igw', 'public_route_table']
+    ))
+    return checks
+
+def grade(creds):
     data = []
     try:
-        with open('data.json') as f:
-            creds = json.load(f)
         access_key = creds['ACCESS_KEY_ID']
         secret_key = creds['SECRET_ACCESS_KEY']
         region = creds['region']
 
-        ec2_client = boto3.client(
-            'ec2',
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            region_name=region
-        )
-
-        # Check VPC
-        vpc_id = check_vpc(ec2_client, data)
-        if not vpc_id:
-            # Append failures for all dependent tests
-            dependent_tests = [
-                ("Internet Gateway Verification", "VPC not found."),
-                ("Public Route Table Configuration", "VPC not found."),
-                ("Public Subnet subnet-public-a", "VPC not found."),
-                ("Public Subnet subnet-public-b", "VPC not found."),
-                ("Private Subnet subnet-private-a", "VPC not found."),
-                ("Private Subnet subnet-private-b", "VPC not found."),
-                ("Public Route Table Associations", "VPC not found.")
-            ]
-            for testid, message in dependent_tests:
-                data.append({
-                    "testid": testid,
-                    "status": "failure",
-                    "score": 0,
-                    "maximum marks": 1,
-                    "message": message
-                })
-            overall = {"data": data}
-            with open('../evaluate.json', 'w') as f:
-                json.dump(overall, f, indent=4)
-            return
-
-        # Check Internet Gateway
-        igw_id = check_igw(ec2_client, vpc_id, data)
-        if not igw_id:
-            # Append failures for dependent tests
-            dependent_tests = [
-                ("Public Route Table Configuration", "Internet Gateway not found."),
-                ("Public Subnet subnet-public-a", "Internet Gateway not found."),
-                ("Public Subnet subnet-public-b", "Internet Gateway not found."),
-                ("Private Subnet subnet-private-a", "Internet Gateway not found."),
-                ("Private Subnet subnet-private-b", "Internet Gateway not found."),
-                ("Public Route Table Associations", "Internet Gateway not found.")
-            ]
-            for testid, message in dependent_tests:
-                data.append({
-                    "testid": testid,
-                    "status": "failure",
-                    "score": 0,
-                    "maximum marks": 1,
-                    "message": message
-                })
-            overall = {"data": data}
-            with open('../evaluate.json', 'w') as f:
-                json.dump(overall, f, indent=4)
-            return
+        ec2_client = aws_clients.get_client('ec2', access_key, secret_key, region)
 
-        # Check Public Route Table
-        public_route_table_id = check_public_route_table(ec2_client, vpc_id, igw_id, data)
-        if not public_route_table_id:
-            # Append failures for dependent tests
-            dependent_tests = [
-                ("Public Subnet subnet-public-a", "Public Route Table not found."),
-                ("Public Subnet subnet-public-b", "Public Route Table not found."),
-                ("Private Subnet subnet-private-a", "Public Route Table not found."),
-                ("Private Subnet subnet-private-b", "Public Route Table not found."),
-                ("Public Route Table Associations", "Public Route Table not found.")
-            ]
-            for testid, message in dependent_tests:
-                data.append({
-                    "testid": testid,
-                    "status": "failure",
-                    "score": 0,
-                    "maximum marks": 1,
-                    "message": message
-                })
-            overall = {"data": data}
-            with open('../evaluate.json', 'w') as f:
-                json.dump(overall, f, indent=4)
-            return
+        data.extend(run_checks(build_checks(ec2_client)))
 
-        # Check Subnets and Route Associations
-        check_public_subnet(ec2_client, vpc_id, 'subnet-public-a', '10.1.1.0/24', 'us-west-2a', public_route_table_id, data)
-        check_public_subnet(ec2_client, vpc_id, 'subnet-public-b', '10.1.2.0/24', 'us-west-2b', public_route_table_id, data)
-        check_private_subnet(ec2_client, vpc_id, 'subnet-private-a', '10.1.3.0/24', 'us-west-2a', public_route_table_id, igw_id, data)
-        check_private_subnet(ec2_client, vpc_id, 'subnet-private-b', '10.1.4.0/24', 'us-west-2b', public_route_table_id, igw_id, data)
-        check_public_route_associations(ec2_client, public_route_table_id, data)
+    except Exception as e:
+        error_result = {
+            "testid": "Script Execution",
+            "status": "failure",
+            "score": 0,
+            "maximum marks": 1,
+            "message": f"Script failed to execute: {e}"
+        }
+        data.append(error_result)
+    return data
 
+def evaluate(lab_directory='.'):
+    """
+    Grade the submission in lab_directory and return the evaluate.json payload.
+    """
+    data = []
+    try:
+        with open(os.path.join(lab_directory, 'data.json')) as f:
+            creds = json.load(f)
+        data = grade(creds)
     except Exception as e:
         error_result = {
             "testid": "Script Execution",
@@ -360,8 +318,10 @@ def main():
             "message": f"Script failed to execute: {e}"
         }
         data.append(error_result)
-    
-    overall = {"data": data}
+    return {"data": data}
+
+def main():
+    overall = evaluate()
     with open('../evaluate.json', 'w') as f:
         json.dump(overall, f, indent=4)
 
@@ -0,0 +1,174 @@
+"""
+Shared boto3 sessions and clients for the graders.
+
+Clients are cached per (access key, region, service), so every check and
+every student graded by the same process reuses one client and its HTTP
+connection pool instead of paying for client construction and a fresh TLS
+handshake each time.
+
+The backend that builds clients is pluggable: set_backend() installs any
+callable with the signature of get_client(), and setting GRADER_LOCAL_FIXTURES
+to a fixture file grades against the in-memory stand-in in local_backend
+instead of AWS. Listeners added with add_call_listener() are told about every
+API call either backend serves, which is how benchmark.py counts them.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import lazy_imports
+
+boto3 = lazy_imports.lazy('boto3')
+botocore_config = lazy_imports.lazy('botocore.config')
+
+# Upper bound on cached clients; the least recently used one is dropped first
+POOL_SIZE = int(os.environ.get('GRADER_CLIENT_POOL_SIZE', '64'))
+# Keep-alive connections each client may hold open
+MAX_POOL_CONNECTIONS = int(os.environ.get('GRADER_MAX_POOL_CONNECTIONS', '10'))
+# Fixture file for the local stand-in; unset means real AWS
+LOCAL_FIXTURES = os.environ.get('GRADER_LOCAL_FIXTURES')
+
+
+class ClientPool:
+    """
+    Thread-safe LRU cache of boto3 sessions and clients.
+    """
+
+    def __init__(self, max_size=POOL_SIZE, max_pool_connections=MAX_POOL_CONNECTIONS):
+        self.max_size = max_size
+        self.max_pool_connections = max_pool_connections
+        self._config = None
+        self._sessions = OrderedDict()
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        # Built on first use, so importing this module does not load botocore
+        if self._config is None:
+            self._config = botocore_config.Config(max_pool_connections=self.max_pool_connections)
+        return self._config
+
+    def session(self, access_key, secret_key, region):
+        return self._session_entry(access_key, secret_key, region)[0]
+
+    def client(self, service, access_key, secret_key, region):
+        key = (access_key, region, service)
+        client = self._lookup(self._clients, key, secret_key)
+        if client is not None:
+            return client
+        session, session_lock = self._session_entry(access_key, secret_key, region)
+        # Session.client() is not thread-safe, so clients of one session are
+        # built one at a time; clients of different sessions build in parallel
+        with session_lock:
+            client = self._lookup(self._clients, key, secret_key)
+            if client is None:
+                client = session.client(service, config=self.config)
+                client.meta.events.register('after-call', _after_call)
+                self._store(self._clients, key, secret_key, client)
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._clients.clear()
+
+    def _session_entry(self, access_key, secret_key, region):
+        key = (access_key, region)
+        entry = self._lookup(self._sessions, key, secret_key)
+        if entry is None:
+            session = boto3.Session(
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                region_name=region
+            )
+            # Another thread may have stored the same session meanwhile
+            entry = self._store(self._sessions, key, secret_key, (session, threading.Lock()))
+        return entry
+
+    def _lookup(self, cache, key, secret_key):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is None or entry[0] != secret_key:
+                return None
+            cache.move_to_end(key)
+            return entry[1]
+
+    def _store(self, cache, key, secret_key, value):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is not None and entry[0] == secret_key:
+                return entry[1]
+            cache[key] = (secret_key, value)
+            while len(cache) > self.max_size:
+                cache.popitem(last=False)
+            return value
+
+
+def _after_call(http_response, model, **kwargs):
+    if not _call_listeners:
+        return
+    # Reading a streaming body here would consume it before the caller does
+    if model.has_streaming_output:
+        size = int(http_response.headers.get('content-length', 0))
+    else:
+        size = len(http_response.content)
+    record_call(model.service_model.service_name, model.name, size)
+
+
+default_pool = ClientPool()
+# Callables notified of every API call as listener(service, operation, bytes)
+_call_listeners = []
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def configure(max_size=None, max_pool_connections=None):
+    """
+    Replace the process-wide pool with one using the given limits.
+    """
+    global default_pool
+    default_pool = ClientPool(
+        max_size=max_size or POOL_SIZE,
+        max_pool_connections=max_pool_connections or MAX_POOL_CONNECTIONS
+    )
+
+
+def set_backend(backend):
+    """
+    Build every client with backend(service, access_key, secret_key, region)
+    from now on; None restores the boto3 pool.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def add_call_listener(listener):
+    _call_listeners.append(listener)
+
+
+def remove_call_listener(listener):
+    _call_listeners.remove(listener)
+
+
+def record_call(service, operation, size=0):
+    """
+    Report one API call and the number of response bytes it transferred.
+    """
+    for listener in list(_call_listeners):
+        listener(service, operation, size)
+
+
+def get_client(service, access_key, secret_key, region):
+    backend = _backend
+    if backend is not None:
+        return backend(service, access_key, secret_key, region)
+    return default_pool.client(service, access_key, secret_key, region)
+
+
+if LOCAL_FIXTURES:
+    # Loaded on import so the stand-in's student apps are serving before the
+    # grader's first request; load() installs itself through set_backend()
+    import local_backend
+    local_backend.load(LOCAL_FIXTURES)
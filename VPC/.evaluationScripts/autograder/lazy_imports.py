@@ -0,0 +1,110 @@
+"""
+Deferred imports of the grader's heavy dependencies.
+
+boto3, botocore, cv2, numpy, bs4 and paramiko take from tens of milliseconds
+to over a second to import on a cold container, and a student who fails an
+early check never needs most of them. Modules name their dependencies with
+
+    cv2 = lazy_imports.lazy('cv2')
+
+and the real import happens, once and thread-safely, on the first attribute
+access. Exception classes work in except clauses too, since those are only
+evaluated when an exception is being handled.
+
+Set GRADER_IMPORT_REPORT to "1" to print the cost of every deferred import
+to stderr when the grader exits, or to a file path to write it there as JSON:
+which modules were loaded, how long each took and how far into the run it
+was first needed. `python3 -X importtime` covers the eager imports.
+"""
+import atexit
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+REPORT = os.environ.get('GRADER_IMPORT_REPORT')
+
+_started = time.perf_counter()
+_modules = {}
+_timings = {}
+_lock = threading.RLock()
+
+
+def load(name):
+    """
+    Import the named module, timing the import the first time.
+    """
+    module = sys.modules.get(name)
+    if module is not None and name in _timings:
+        return module
+    with _lock:
+        if name not in _timings:
+            start_time = time.perf_counter()
+            module = importlib.import_module(name)
+            _timings[name] = {
+                "seconds": round(time.perf_counter() - start_time, 6),
+                # Close to zero if something else had imported it already
+                "first_needed_at_s": round(start_time - _started, 6),
+            }
+        return sys.modules[name]
+
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is needed.
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attribute):
+        return getattr(load(self._name), attribute)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy(name):
+    with _lock:
+        proxy = _modules.get(name)
+        if proxy is None:
+            proxy = _modules[name] = LazyModule(name)
+        return proxy
+
+
+def preload():
+    """
+    Import every module named so far, e.g. before a daemon starts serving.
+    """
+    with _lock:
+        names = list(_modules)
+    for name in names:
+        load(name)
+
+
+def report():
+    with _lock:
+        return {
+            "loaded": dict(_timings),
+            "not_loaded": sorted(name for name in _modules if name not in _timings),
+            "total_s": round(sum(t["seconds"] for t in _timings.values()), 6),
+        }
+
+
+def _write_report():
+    summary = report()
+    if REPORT in ('1', 'stderr'):
+        for name, timing in sorted(summary["loaded"].items(), key=lambda item: -item[1]["seconds"]):
+            print(f"import {name}: {timing['seconds'] * 1000:.1f} ms "
+                  f"(first needed at {timing['first_needed_at_s'] * 1000:.1f} ms)", file=sys.stderr)
+        for name in summary["not_loaded"]:
+            print(f"import {name}: never needed", file=sys.stderr)
+        return
+    with open(REPORT, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+
+if REPORT:
+    atexit.register(_write_report)
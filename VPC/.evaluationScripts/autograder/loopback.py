@@ -0,0 +1,23 @@
+"""
+Loopback addresses for the local stand-ins.
+
+Linux routes all of 127.0.0.0/8 to the loopback interface, so every student
+of a stand-in gets an address of their own and is told apart by the address
+a connection arrives on. The mapping is one-to-one and skips addresses whose
+last byte is 0.
+"""
+
+# Students up to 127.255.255.254; 127.255.255.255 is the broadcast address
+MAX_STUDENTS = 0xFFFFFF * 255 // 256
+
+
+def loopback_address(index):
+    """
+    The address of the student at 0-based index: 127.0.0.1 to 127.0.0.255,
+    then 127.0.1.1 and so on.
+    """
+    if not 0 <= index < MAX_STUDENTS:
+        raise ValueError(f"no loopback address for student {index}")
+    # Skip one number after every 255, so the host byte is never 0
+    n = index + index // 255 + 1
+    return f"127.{n >> 16}.{(n >> 8) & 255}.{n & 255}"
@@ -0,0 +1,90 @@
+"""
+Single snapshot of a student's VPC topology.
+
+The VPC, internet gateway, subnets and route tables are fetched once per
+student (every call paginated) and indexed in memory, so the checks evaluate
+against the snapshot without making any further EC2 API calls.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+VPC_NAME = 'aws-vpc'
+IGW_NAME = 'aws-igw'
+SUBNET_NAMES = ['subnet-public-a', 'subnet-public-b', 'subnet-private-a', 'subnet-private-b']
+
+
+def tag_name(resource):
+    for tag in resource.get('Tags', []):
+        if tag['Key'] == 'Name':
+            return tag['Value']
+    return None
+
+
+def describe_all(ec2_client, operation, result_key, **kwargs):
+    """
+    Return every item of a paginated EC2 describe call.
+    """
+    items = []
+    for page in ec2_client.get_paginator(operation).paginate(**kwargs):
+        items.extend(page.get(result_key, []))
+    return items
+
+
+def index_by_name(resources):
+    # The first resource with a given Name tag wins, like the [0] lookups the
+    # checks used to do on filtered API responses
+    index = {}
+    for resource in resources:
+        index.setdefault(tag_name(resource), resource)
+    return index
+
+
+class Topology:
+    """
+    In-memory indexes over one snapshot.
+    """
+
+    def __init__(self, vpcs, internet_gateways, subnets, route_tables):
+        self.vpcs = vpcs
+        self.internet_gateways = internet_gateways
+        self.subnets = subnets
+        self.route_tables = route_tables
+
+        self.vpcs_by_name = index_by_name(vpcs)
+        self.internet_gateways_by_name = index_by_name(internet_gateways)
+        self.subnets_by_name = index_by_name(subnets)
+        self.route_tables_by_name = index_by_name(route_tables)
+        self.route_tables_by_id = {rt['RouteTableId']: rt for rt in route_tables}
+        self.route_table_by_subnet = {}
+        self.main_route_table = {}
+        for rt in route_tables:
+            for association in rt.get('Associations', []):
+                if 'SubnetId' in association:
+                    self.route_table_by_subnet.setdefault(association['SubnetId'], rt)
+                if association.get('Main'):
+                    self.main_route_table.setdefault(rt['VpcId'], rt)
+
+
+def fetch_topology(ec2_client):
+    """
+    Fetch the snapshot in two rounds of API calls: the VPC, internet gateway
+    and subnets concurrently, then the route tables of the VPC.
+    """
+    def name_filter(*names):
+        return [{'Name': 'tag:Name', 'Values': list(names)}]
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        vpcs = pool.submit(describe_all, ec2_client, 'describe_vpcs', 'Vpcs',
+                           Filters=name_filter(VPC_NAME))
+        igws = pool.submit(describe_all, ec2_client, 'describe_internet_gateways', 'InternetGateways',
+                           Filters=name_filter(IGW_NAME))
+        # Subnets are looked up by name rather than VPC id so that a subnet
+        # created in the wrong VPC is still reported as such
+        subnets = pool.submit(describe_all, ec2_client, 'describe_subnets', 'Subnets',
+                              Filters=name_filter(*SUBNET_NAMES))
+        vpcs, igws, subnets = vpcs.result(), igws.result(), subnets.result()
+
+    route_tables = []
+    if vpcs:
+        route_tables = describe_all(ec2_client, 'describe_route_tables', 'RouteTables',
+                                    Filters=[{'Name': 'vpc-id', 'Values': [vpcs[0]['VpcId']]}])
+    return Topology(vpcs, igws, subnets, route_tables)
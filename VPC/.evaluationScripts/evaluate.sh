@@ -11,6 +11,14 @@ ptcd=$(pwd)
 cd $INSTRUCTOR_SCRIPTS
 # echo $ptcd
 
+# A running grader daemon (autograder/grader_daemon.py) grades the lab
+# directory in place; without one, grade it in a fresh process below
+GRADER_DAEMON_SOCKET="${GRADER_DAEMON_SOCKET:-/tmp/grader_daemon.sock}"
+if [ -S "$GRADER_DAEMON_SOCKET" ] && python3 autograder/grader_daemon.py --socket "$GRADER_DAEMON_SOCKET" submit "$LAB_DIRECTORY" --output evaluate.json; then
+    cd "$ptcd"
+    exit 0
+fi
+
 list_of_files="$(ls $LAB_DIRECTORY)"
 
 
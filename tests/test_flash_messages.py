@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'CLOUD9_S3', '.evaluationScripts', 'autograder'))
+
+import flash_messages  # noqa: E402
+
+SUCCESS = 'File uploaded successfully.Image ID: pic_1234.jpg'
+
+
+def page(div):
+    return f'<html><body><div class="container">{div}</div></body></html>'.encode()
+
+
+class Response:
+    def __init__(self, content):
+        self.content = content
+
+    def iter_content(self, chunk_size):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+
+@pytest.mark.parametrize('div', [
+    f'<div class="alert alert-success">{SUCCESS}</div>',
+    f'<div class="alert-success alert">{SUCCESS}</div>',
+    f"<div id='x' class='alert'>\n    {SUCCESS}\n</div>",
+])
+def test_alert_class_token_matches(div):
+    assert [message for message, end in flash_messages.scan_alerts(page(div))] == [SUCCESS]
+
+
+@pytest.mark.parametrize('div', [
+    f'<div class="alert-success">{SUCCESS}</div>',
+    f'<div class="alerts">{SUCCESS}</div>',
+    f'<div class="ALERT">{SUCCESS}</div>',
+    f'<div data-class="alert">{SUCCESS}</div>',
+])
+def test_other_classes_do_not_match(div):
+    assert list(flash_messages.scan_alerts(page(div))) == []
+
+
+@pytest.mark.parametrize('div', [
+    f'<div class="alert alert-success">{SUCCESS}</div>',
+    f'<div class="alert-success">{SUCCESS}</div>',
+    f'<div class="ALERT">{SUCCESS}</div>',
+    f'<div data-class="alert">{SUCCESS}</div>',
+])
+def test_fast_path_agrees_with_parser(div):
+    pytest.importorskip('bs4')
+    content = page(div)
+    fast = next((flash_messages.image_id_in(message) for message, end in flash_messages.scan_alerts(content)), None)
+    assert fast in (None, flash_messages.parse_image_id(content))
+    assert flash_messages.find_image_id(Response(content)) == flash_messages.parse_image_id(content)
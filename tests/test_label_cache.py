@@ -0,0 +1,159 @@
+import importlib.util
+import io
+import json
+import os
+
+import pytest
+from botocore.exceptions import ClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = os.path.join(ROOT, 'Rekognition_Lambda', 'labDirectory', 'FlaskApp', 'label_cache.py')
+
+spec = importlib.util.spec_from_file_location('label_cache', PATH)
+label_cache = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(label_cache)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class StubS3:
+    """
+    The labels bucket. Objects carry an ETag, and GetObject honours
+    IfNoneMatch the way S3 does, with a 304 error.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = []
+        self.error = None
+
+    def put(self, image_name, data, etag):
+        self.objects[f'labels/{image_name}.json'] = (json.dumps(data).encode(), etag)
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None):
+        self.requests.append((Key, IfNoneMatch))
+        if self.error is not None:
+            raise ClientError({'Error': {'Code': self.error}}, 'GetObject')
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        body, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304'}}, 'GetObject')
+        return {'Body': io.BytesIO(body), 'ETag': etag}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(label_cache, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def s3():
+    return StubS3()
+
+
+def new_cache(s3, **kwargs):
+    options = dict(max_entries=3, fresh_for=30.0, negative_ttl=2.0)
+    options.update(kwargs)
+    return label_cache.LabelCache(s3, 'labels-bucket', **options)
+
+
+def test_fresh_entries_are_served_without_asking_s3(clock, s3):
+    s3.put('a.jpg', {'Labels': ['Cat']}, '"e1"')
+    cache = new_cache(s3)
+    assert cache.get('a.jpg') == {'Labels': ['Cat']}
+    clock.now += 29
+    assert cache.get('a.jpg') == {'Labels': ['Cat']}
+    assert s3.requests == [('labels/a.jpg.json', None)]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_stale_entry_is_revalidated_with_its_etag(clock, s3):
+    s3.put('a.jpg', {'Labels': ['Cat']}, '"e1"')
+    cache = new_cache(s3)
+    first = cache.get('a.jpg')
+    clock.now += 31
+    assert cache.get('a.jpg') is first
+    assert s3.requests[-1] == ('labels/a.jpg.json', '"e1"')
+    assert cache.stats()['revalidated'] == 1
+    # A 304 makes the entry fresh again
+    clock.now += 29
+    cache.get('a.jpg')
+    assert len(s3.requests) == 2
+
+
+def test_changed_document_is_refreshed(clock, s3):
+    s3.put('a.jpg', {'Labels': ['Cat']}, '"e1"')
+    cache = new_cache(s3)
+    cache.get('a.jpg')
+    s3.put('a.jpg', {'Labels': ['Dog']}, '"e2"')
+    clock.now += 31
+    assert cache.get('a.jpg') == {'Labels': ['Dog']}
+    clock.now += 31
+    cache.get('a.jpg')
+    assert s3.requests[-1] == ('labels/a.jpg.json', '"e2"')
+    assert cache.stats()['refreshed'] == 1
+
+
+def test_missing_labels_are_remembered_for_the_negative_ttl(clock, s3):
+    cache = new_cache(s3)
+    assert cache.get('a.jpg') is None
+    clock.now += 1
+    assert cache.get('a.jpg') is None
+    assert len(s3.requests) == 1
+    s3.put('a.jpg', {'Labels': ['Cat']}, '"e1"')
+    clock.now += 1.5
+    assert cache.get('a.jpg') == {'Labels': ['Cat']}
+    # A negative entry has no ETag to revalidate with
+    assert s3.requests[-1] == ('labels/a.jpg.json', None)
+    stats = cache.stats()
+    assert (stats['not_found'], stats['negative_hits'], stats['misses']) == (1, 1, 1)
+
+
+def test_other_errors_are_raised_and_not_cached(clock, s3):
+    s3.put('a.jpg', {'Labels': ['Cat']}, '"e1"')
+    cache = new_cache(s3)
+    s3.error = 'AccessDenied'
+    with pytest.raises(ClientError):
+        cache.get('a.jpg')
+    s3.error = None
+    assert cache.get('a.jpg') == {'Labels': ['Cat']}
+    assert cache.stats()['errors'] == 1
+
+
+def test_least_recently_used_entry_is_evicted(clock, s3):
+    for name in 'abcd':
+        s3.put(f'{name}.jpg', {'Labels': [name]}, f'"{name}"')
+    cache = new_cache(s3)
+    for name in 'abc':
+        cache.get(f'{name}.jpg')
+    cache.get('a.jpg')  # b is now the least recently used
+    cache.get('d.jpg')
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['evictions'] == 1
+    requests = len(s3.requests)
+    cache.get('a.jpg')
+    assert len(s3.requests) == requests
+    cache.get('b.jpg')
+    assert len(s3.requests) == requests + 1
+
+
+def test_hit_ratio(clock, s3):
+    cache = new_cache(s3)
+    assert cache.stats()['hit_ratio'] is None
+    s3.put('a.jpg', {'Labels': []}, '"e1"')
+    cache.get('a.jpg')
+    cache.get('a.jpg')
+    clock.now += 31
+    cache.get('a.jpg')
+    cache.get('b.jpg')
+    # hit and revalidation saved a download; miss and not-found did not
+    assert cache.stats()['hit_ratio'] == 0.5
@@ -0,0 +1,104 @@
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'Rekognition_Lambda', '.evaluationScripts', 'autograder'))
+
+import log_fetch  # noqa: E402
+
+MESSAGES = [
+    'Processing image: a+b.jpg from bucket: src',
+    'Generated labels for image: a+b.jpg',
+    'Successfully processed labels for image: a+b.jpg and stored in bucket: labels',
+]
+
+
+class StubLogs:
+    """
+    CloudWatch Logs client serving fixed pages per stream. The last page's
+    token repeats, as the real service does at the end of a stream.
+    """
+
+    def __init__(self, streams):
+        self.streams = streams
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def describe_log_streams(self, **kwargs):
+        return {'logStreams': [{'logStreamName': name} for name in self.streams][:kwargs['limit']]}
+
+    def get_log_events(self, logGroupName, logStreamName, startFromHead, nextToken=None, startTime=None):
+        with self._lock:
+            self.requests.append((logStreamName, nextToken))
+        pages = self.streams[logStreamName]
+        index = 0 if nextToken is None else int(nextToken.rsplit('-', 1)[1])
+        events = [{'message': message} for message in pages[index]] if index < len(pages) else []
+        next_index = min(index + 1, len(pages))
+        return {'events': events, 'nextForwardToken': f'f/{logStreamName}-{next_index}'}
+
+
+def new_search():
+    return log_fetch.LogSearch(log_fetch.LogMatcher(MESSAGES))
+
+
+def test_matcher_reports_each_message_once_and_escapes_patterns():
+    matcher = log_fetch.LogMatcher(MESSAGES)
+    text = f'START\n{MESSAGES[1]}\n{MESSAGES[1]}\nab.jpg'
+    assert matcher.scan(text) == {1}
+    assert matcher.scan('Generated labels for image: aab.jpg') == set()
+
+
+def test_search_completes_across_events():
+    search = new_search()
+    search.add(MESSAGES[0])
+    search.add('unrelated')
+    assert search.seen(0) and not search.seen(1)
+    assert not search.complete.is_set()
+    search.add(MESSAGES[1] + ' ' + MESSAGES[2])
+    assert search.complete.is_set()
+
+
+def test_empty_page_mid_stream_does_not_stop_the_search():
+    client = StubLogs({'s': [[MESSAGES[0]], [], [], [MESSAGES[1], MESSAGES[2]]]})
+    search = new_search()
+    log_fetch.search_stream(client, 'group', 's', search)
+    assert search.complete.is_set()
+
+
+def test_stream_ends_when_the_forward_token_repeats():
+    client = StubLogs({'s': [[MESSAGES[0]], []]})
+    search = new_search()
+    log_fetch.search_stream(client, 'group', 's', search)
+    assert search.found == {0}
+    assert client.requests == [('s', None), ('s', 'f/s-1'), ('s', 'f/s-2')]
+
+
+def test_stream_stops_once_everything_is_seen():
+    client = StubLogs({'s': [MESSAGES, [], ['late']]})
+    search = new_search()
+    log_fetch.search_stream(client, 'group', 's', search)
+    assert search.complete.is_set()
+    assert len(client.requests) == 1
+
+
+def test_page_limit_bounds_an_endless_stream(monkeypatch):
+    monkeypatch.setattr(log_fetch, 'MAX_PAGES', 3)
+    client = StubLogs({'s': [[]] * 10})
+    log_fetch.search_stream(client, 'group', 's', new_search())
+    assert len(client.requests) == 3
+
+
+def test_messages_spread_over_streams():
+    client = StubLogs({
+        'a': [[MESSAGES[0]], []],
+        'b': [[], [MESSAGES[1]]],
+        'c': [[], [], [MESSAGES[2]]],
+    })
+    search = log_fetch.search_streams(client, 'group', new_search())
+    assert search.complete.is_set()
+
+
+def test_no_streams():
+    search = log_fetch.search_streams(StubLogs({}), 'group', new_search())
+    assert search.found == set()
@@ -0,0 +1,40 @@
+import glob
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPIES = sorted(glob.glob(os.path.join(ROOT, '*', '.evaluationScripts', 'autograder', 'loopback.py')))
+
+
+def load(path):
+    spec = importlib.util.spec_from_file_location('loopback', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize('path', COPIES, ids=lambda path: path.split(os.sep)[-4])
+def test_addresses_are_distinct(path):
+    loopback = load(path)
+    addresses = [loopback.loopback_address(index) for index in range(2000)]
+    assert len(set(addresses)) == 2000
+    assert all(address.startswith('127.') and not address.endswith('.0') for address in addresses)
+
+
+@pytest.mark.parametrize('path', COPIES, ids=lambda path: path.split(os.sep)[-4])
+def test_addresses_around_the_skipped_byte(path):
+    loopback = load(path)
+    assert loopback.loopback_address(0) == '127.0.0.1'
+    assert loopback.loopback_address(254) == '127.0.0.255'
+    assert loopback.loopback_address(255) == '127.0.1.1'
+    assert loopback.loopback_address(256) == '127.0.1.2'
+    with pytest.raises(ValueError):
+        loopback.loopback_address(loopback.MAX_STUDENTS)
+
+
+def test_copies_are_identical():
+    assert len(COPIES) >= 2
+    contents = {open(path).read() for path in COPIES}
+    assert len(contents) == 1
@@ -0,0 +1,83 @@
+import email.parser
+import email.policy
+import glob
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPIES = sorted(glob.glob(os.path.join(ROOT, '*', '.evaluationScripts', 'autograder', 'multipart.py')))
+
+
+@pytest.fixture(params=COPIES, ids=lambda path: path.split(os.sep)[-4])
+def multipart(request):
+    spec = importlib.util.spec_from_file_location('multipart', request.param)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse(body):
+    """
+    The parts of a multipart/form-data body, as the server would read them.
+    """
+    raw = b''.join(bytes(chunk) for chunk in body)
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {body.content_type}\r\n\r\n'.encode() + raw)
+    return raw, list(message.iter_parts())
+
+
+def test_framing(multipart):
+    content = b'\x89PNG\r\n--not-a-boundary\r\n' + bytes(range(256))
+    body = multipart.MultipartBody('file', 'test.png', content, 'image/png')
+    raw, parts = parse(body)
+    assert raw.startswith(f'--{body.boundary}\r\n'.encode())
+    assert raw.endswith(f'\r\n--{body.boundary}--\r\n'.encode())
+    assert body.content_type == f'multipart/form-data; boundary={body.boundary}'
+    assert len(parts) == 1
+    part = parts[0]
+    assert part.get_content_type() == 'image/png'
+    assert part.get_param('name', header='content-disposition') == 'file'
+    assert part.get_filename() == 'test.png'
+    assert part.get_payload(decode=True) == content
+
+
+def test_length_matches_the_bytes_sent(multipart):
+    content = os.urandom(3 * multipart.CHUNK_SIZE + 17)
+    body = multipart.MultipartBody('file', 'big.jpg', content, 'image/jpeg')
+    chunks = list(body)
+    assert len(body) == sum(len(chunk) for chunk in chunks)
+    # Head, four slices of the content, tail; none larger than CHUNK_SIZE
+    assert len(chunks) == 6
+    assert all(isinstance(chunk, memoryview) and len(chunk) <= multipart.CHUNK_SIZE for chunk in chunks)
+
+
+def test_body_can_be_sent_twice(multipart):
+    body = multipart.MultipartBody('file', 'a.jpg', b'abc')
+    assert b''.join(map(bytes, body)) == b''.join(map(bytes, body))
+
+
+def test_boundaries_differ_per_body(multipart):
+    assert multipart.MultipartBody('f', 'a', b'').boundary != multipart.MultipartBody('f', 'a', b'').boundary
+
+
+def test_empty_content(multipart):
+    body = multipart.MultipartBody('file', 'empty.jpg', b'')
+    assert len(list(body)) == 2
+    assert parse(body)[1][0].get_payload(decode=True) == b''
+
+
+def test_mapped_file_is_mapped_once(multipart, tmp_path):
+    path = tmp_path / 'image.jpg'
+    path.write_bytes(b'jpeg bytes')
+    view = multipart.mapped_file(str(path))
+    assert bytes(view) == b'jpeg bytes'
+    assert view.readonly
+    assert multipart.mapped_file(os.path.relpath(path)) is view
+
+
+def test_mapped_empty_file(multipart, tmp_path):
+    path = tmp_path / 'empty.jpg'
+    path.write_bytes(b'')
+    assert bytes(multipart.mapped_file(str(path))) == b''
@@ -0,0 +1,110 @@
+import importlib.util
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = os.path.join(ROOT, 'IAM', '.evaluationScripts', 'autograder', 'policy_eval.py')
+
+spec = importlib.util.spec_from_file_location('policy_eval', PATH)
+policy_eval = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(policy_eval)
+
+
+def policy(*statements):
+    return policy_eval.compile_policy({'Version': '2012-10-17', 'Statement': list(statements)})
+
+
+def allow(**fields):
+    return dict(Effect='Allow', **fields)
+
+
+def deny(**fields):
+    return dict(Effect='Deny', **fields)
+
+
+def test_explicit_deny_beats_allow():
+    p = policy(allow(Action='s3:*', Resource='*'), deny(Action='s3:DeleteBucket', Resource='*'))
+    assert p.evaluate('s3:ListBucket') == policy_eval.ALLOWED
+    assert p.evaluate('s3:DeleteBucket') == policy_eval.EXPLICIT_DENY
+
+
+def test_unlisted_actions_are_implicitly_denied():
+    p = policy(allow(Action='s3:ListBucket', Resource='*'))
+    assert p.evaluate('ec2:RunInstances') == policy_eval.IMPLICIT_DENY
+
+
+def test_not_action():
+    p = policy(allow(NotAction='iam:*', Resource='*'))
+    assert p.evaluate('s3:GetObject') == policy_eval.ALLOWED
+    assert p.evaluate('iam:CreateUser') == policy_eval.IMPLICIT_DENY
+
+
+def test_not_resource_on_any_resource_is_ambiguous():
+    p = policy(allow(Action='s3:*', NotResource='arn:aws:s3:::secret/*'))
+    assert p.evaluate('s3:GetObject') is None
+    assert p.evaluate('s3:GetObject', 'arn:aws:s3:::public/a') == policy_eval.ALLOWED
+    assert p.evaluate('s3:GetObject', 'arn:aws:s3:::secret/a') == policy_eval.IMPLICIT_DENY
+
+
+@pytest.mark.parametrize('pattern, action, expected', [
+    ('ec2:Describe*', 'ec2:DescribeInstances', True),
+    ('ec2:Describe*', 'ec2:RunInstances', False),
+    ('lambda:?etFunction', 'lambda:GetFunction', True),
+    ('lambda:?etFunction', 'lambda:GetFunctions', False),
+    ('S3:LIST*', 's3:ListBucket', True),
+    ('*', 'cloudwatch:PutMetricData', True),
+])
+def test_action_wildcards(pattern, action, expected):
+    decision = policy(allow(Action=pattern, Resource='*')).evaluate(action)
+    assert (decision == policy_eval.ALLOWED) is expected
+
+
+def test_resource_wildcards_are_case_sensitive():
+    p = policy(allow(Action='s3:GetObject', Resource='arn:aws:s3:::bucket/*'))
+    assert p.evaluate('s3:GetObject', 'arn:aws:s3:::bucket/key') == policy_eval.ALLOWED
+    assert p.evaluate('s3:GetObject', 'arn:aws:s3:::BUCKET/key') == policy_eval.IMPLICIT_DENY
+
+
+def test_condition_is_ambiguous():
+    p = policy(allow(Action='s3:*', Resource='*', Condition={'Bool': {'aws:SecureTransport': 'true'}}))
+    assert p.evaluate('s3:GetObject') is None
+
+
+def test_conditional_deny_is_ambiguous_even_when_allowed():
+    p = policy(allow(Action='s3:*', Resource='*'),
+               deny(Action='s3:*', Resource='*', Condition={'Bool': {'aws:MultiFactorAuthPresent': 'false'}}))
+    assert p.evaluate('s3:GetObject') is None
+
+
+def test_resource_scoped_allow_is_ambiguous():
+    p = policy(allow(Action='s3:GetObject', Resource='arn:aws:s3:::bucket/*'))
+    assert p.evaluate('s3:GetObject') is None
+
+
+def test_unconditional_allow_settles_a_conditional_one():
+    p = policy(allow(Action='s3:*', Resource='*'),
+               allow(Action='s3:*', Resource='*', Condition={'Bool': {'aws:SecureTransport': 'true'}}))
+    assert p.evaluate('s3:GetObject') == policy_eval.ALLOWED
+
+
+def test_evaluate_test_case():
+    p = policy(allow(Action=['s3:*', 'ec2:Describe*'], Resource='*'), deny(Action='s3:Delete*', Resource='*'))
+    assert policy_eval.evaluate_test_case(p, ['s3:GetObject'], ['s3:DeleteObject']) is True
+    assert policy_eval.evaluate_test_case(p, ['ec2:RunInstances'], []) is False
+    assert policy_eval.evaluate_test_case(p, [], ['ec2:DescribeInstances']) is False
+    scoped = policy(allow(Action='s3:GetObject', Resource='arn:aws:s3:::bucket/*'))
+    assert policy_eval.evaluate_test_case(scoped, ['s3:GetObject'], []) is None
+
+
+def test_comments_in_the_lab_template_are_ignored():
+    p = policy_eval.compile_policy('{\n  // lab template\n  "Statement": [{"Effect": "Allow", "Action": "s3:*", '
+                                   '"Resource": "arn:aws:s3:::a//b"}]\n}')
+    assert p.statements[0].resources == ['arn:aws:s3:::a//b']
+
+
+def test_invalid_statements_are_rejected():
+    with pytest.raises(ValueError):
+        policy({'Effect': 'Maybe', 'Action': 's3:*'})
+    with pytest.raises(ValueError):
+        policy(allow(Resource='*'))
@@ -0,0 +1,129 @@
+import importlib.util
+import os
+import threading
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = os.path.join(ROOT, 'VPC', '.evaluationScripts', 'autograder', 'scheduler.py')
+
+spec = importlib.util.spec_from_file_location('scheduler', PATH)
+scheduler = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(scheduler)
+Check = scheduler.Check
+
+
+def passing(testid, value=True, log=None):
+    def run(outputs, data):
+        if log is not None:
+            log.append((testid, dict(outputs)))
+        data.append({"testid": testid, "status": "success", "score": 1, "maximum marks": 1, "message": "ok"})
+        return value
+    return run
+
+
+def failing(testid):
+    def run(outputs, data):
+        data.append(scheduler.failure_record(testid, f"{testid} is wrong"))
+        return None
+    return run
+
+
+def record_testids(records):
+    return [record["testid"] for record in records]
+
+
+def test_records_come_back_in_declaration_order():
+    finished = threading.Event()
+
+    def slow(outputs, data):
+        finished.wait(2)
+        data.append({"testid": "slow", "score": 1})
+        return True
+
+    def fast(outputs, data):
+        data.append({"testid": "fast", "score": 1})
+        finished.set()
+        return True
+
+    records = scheduler.run_checks([Check('slow', slow, ['slow']), Check('fast', fast, ['fast'])])
+    assert record_testids(records) == ['slow', 'fast']
+
+
+def test_requirements_run_first_and_their_outputs_are_passed_on():
+    log = []
+    checks = [
+        Check('c', passing('c', log=log), ['c'], requires=['a', 'b']),
+        Check('b', passing('b', value='vpc-1', log=log), ['b'], requires=['a']),
+        Check('a', passing('a', value={'id': 1}, log=log), ['a']),
+    ]
+    records = scheduler.run_checks(checks)
+    assert record_testids(records) == ['c', 'b', 'a']
+    assert [name for name, _ in log] == ['a', 'b', 'c']
+    assert log[2][1] == {'a': {'id': 1}, 'b': 'vpc-1'}
+
+
+def test_ready_checks_run_concurrently():
+    barrier = threading.Barrier(2, timeout=2)
+
+    def meet(outputs, data):
+        barrier.wait()
+        return True
+
+    checks = [Check('a', meet, []), Check('b', meet, [])]
+    scheduler.run_checks(checks, max_workers=2)
+
+
+def test_failure_skips_dependents_transitively():
+    ran = []
+    checks = [
+        Check('vpc', failing('VPC'), ['VPC'], missing_message='VPC not found.'),
+        Check('igw', lambda outputs, data: ran.append('igw'), ['IGW'], requires=['vpc']),
+        Check('routes', lambda outputs, data: ran.append('routes'), ['Routes 1', 'Routes 2'], requires=['igw']),
+        Check('other', passing('Other'), ['Other']),
+    ]
+    records = scheduler.run_checks(checks)
+    assert ran == []
+    assert record_testids(records) == ['VPC', 'IGW', 'Routes 1', 'Routes 2', 'Other']
+    assert [record['message'] for record in records[1:4]] == ['VPC not found.'] * 3
+    assert all(record['score'] == 0 for record in records[:4])
+    assert records[4]['score'] == 1
+
+
+def test_exception_replaces_records_and_is_named_downstream():
+    def broken(outputs, data):
+        data.append({"testid": "partial"})
+        raise RuntimeError('throttled')
+
+    checks = [
+        Check('topology', broken, ['Topology'], missing_message='Topology not fetched.'),
+        Check('vpc', passing('VPC'), ['VPC'], requires=['topology']),
+    ]
+    records = scheduler.run_checks(checks)
+    assert records[0]['testid'] == 'Topology'
+    assert records[0]['message'] == 'Error running check: throttled'
+    assert records[1]['message'] == 'Topology not fetched. (throttled)'
+
+
+def test_falsy_output_counts_as_failure():
+    checks = [
+        Check('subnets', passing('Subnets', value=[]), ['Subnets']),
+        Check('routes', passing('Routes'), ['Routes'], requires=['subnets']),
+    ]
+    records = scheduler.run_checks(checks)
+    assert records[0]['score'] == 1
+    assert records[1]['message'] == 'subnets not found.'
+
+
+def test_unknown_requirement():
+    with pytest.raises(ValueError, match='unknown'):
+        scheduler.run_checks([Check('a', passing('a'), ['a'], requires=['nope'])])
+
+
+def test_circular_requirements():
+    checks = [
+        Check('a', passing('a'), ['a'], requires=['b']),
+        Check('b', passing('b'), ['b'], requires=['a']),
+    ]
+    with pytest.raises(ValueError, match='circular'):
+        scheduler.run_checks(checks)
@@ -0,0 +1,110 @@
+import importlib.util
+import os
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH = os.path.join(ROOT, 'VPC', '.evaluationScripts', 'autograder', 'topology.py')
+
+spec = importlib.util.spec_from_file_location('topology', PATH)
+topology = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(topology)
+
+
+def named(name, **fields):
+    return dict(fields, Tags=[{'Key': 'Owner', 'Value': 'student'}, {'Key': 'Name', 'Value': name}])
+
+
+VPC = named('aws-vpc', VpcId='vpc-1')
+IGW = named('aws-igw', InternetGatewayId='igw-1', Attachments=[{'VpcId': 'vpc-1'}])
+SUBNETS = [
+    named('subnet-public-a', SubnetId='subnet-1', VpcId='vpc-1'),
+    named('subnet-public-b', SubnetId='subnet-2', VpcId='vpc-1'),
+    named('subnet-private-a', SubnetId='subnet-3', VpcId='vpc-1'),
+    # A second subnet with the same name does not shadow the first
+    named('subnet-public-a', SubnetId='subnet-9', VpcId='vpc-1'),
+]
+ROUTE_TABLES = [
+    {'RouteTableId': 'rtb-main', 'VpcId': 'vpc-1', 'Associations': [{'Main': True}]},
+    named('public-rt', RouteTableId='rtb-public', VpcId='vpc-1', Associations=[
+        {'Main': False, 'SubnetId': 'subnet-1'},
+        {'Main': False, 'SubnetId': 'subnet-2'},
+    ]),
+]
+
+
+class Paginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        with self.client.lock:
+            self.client.calls.append((self.operation, kwargs))
+        return self.client.pages[self.operation]
+
+
+class StubEC2:
+    """
+    EC2 client whose describe calls return fixed pages.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_paginator(self, operation):
+        return Paginator(self, operation)
+
+
+def stub(vpcs=(VPC,)):
+    return StubEC2({
+        'describe_vpcs': [{'Vpcs': list(vpcs)}],
+        'describe_internet_gateways': [{'InternetGateways': [IGW]}],
+        # Results spread over pages, one of them empty
+        'describe_subnets': [{'Subnets': SUBNETS[:2]}, {'Subnets': []}, {'Subnets': SUBNETS[2:]}],
+        'describe_route_tables': [{'RouteTables': ROUTE_TABLES[:1]}, {'RouteTables': ROUTE_TABLES[1:]}],
+    })
+
+
+def test_lookups():
+    snapshot = topology.Topology([VPC], [IGW], SUBNETS, ROUTE_TABLES)
+    assert snapshot.vpcs_by_name['aws-vpc'] is VPC
+    assert snapshot.internet_gateways_by_name['aws-igw'] is IGW
+    assert snapshot.subnets_by_name['subnet-public-a']['SubnetId'] == 'subnet-1'
+    assert 'subnet-private-b' not in snapshot.subnets_by_name
+    assert snapshot.route_tables_by_name['public-rt']['RouteTableId'] == 'rtb-public'
+    assert snapshot.route_tables_by_id['rtb-main'] is ROUTE_TABLES[0]
+    assert snapshot.route_table_by_subnet['subnet-2']['RouteTableId'] == 'rtb-public'
+    assert 'subnet-3' not in snapshot.route_table_by_subnet
+    assert snapshot.main_route_table['vpc-1']['RouteTableId'] == 'rtb-main'
+
+
+def test_untagged_resources_are_indexed_under_none():
+    snapshot = topology.Topology([], [], [], ROUTE_TABLES)
+    assert snapshot.route_tables_by_name[None] is ROUTE_TABLES[0]
+
+
+def test_fetch_reads_every_page_once():
+    client = stub()
+    snapshot = topology.fetch_topology(client)
+    assert [subnet['SubnetId'] for subnet in snapshot.subnets] == ['subnet-1', 'subnet-2', 'subnet-3', 'subnet-9']
+    assert len(snapshot.route_tables) == 2
+    operations = sorted(operation for operation, _ in client.calls)
+    assert operations == ['describe_internet_gateways', 'describe_route_tables', 'describe_subnets', 'describe_vpcs']
+
+
+def test_fetch_filters():
+    client = stub()
+    topology.fetch_topology(client)
+    filters = {operation: kwargs['Filters'] for operation, kwargs in client.calls}
+    assert filters['describe_vpcs'] == [{'Name': 'tag:Name', 'Values': ['aws-vpc']}]
+    assert filters['describe_subnets'] == [{'Name': 'tag:Name', 'Values': topology.SUBNET_NAMES}]
+    assert filters['describe_route_tables'] == [{'Name': 'vpc-id', 'Values': ['vpc-1']}]
+
+
+def test_fetch_without_a_vpc_skips_route_tables():
+    client = stub(vpcs=())
+    snapshot = topology.fetch_topology(client)
+    assert snapshot.route_tables == [] and snapshot.vpcs_by_name == {}
+    assert 'describe_route_tables' not in [operation for operation, _ in client.calls]